@@ -30,6 +30,8 @@ DB_NAME = os.getenv("DB_NAME", "telegram_downloader")
 STRING = os.getenv("STRING", None)
 MASTER_KEY = os.getenv("MASTER_KEY", "0zZvUhB9NSi3SYVWB3a0WgG3HpGGtuYV")
 IV_KEY = os.getenv("IV_KEY", "sNskkKYWqdpO")
+KEY_VERSION = int(os.getenv("KEY_VERSION", "1"))  # tag of MASTER_KEY/IV_KEY in new ciphertexts
+OLD_KEYS = os.getenv("OLD_KEYS", "")  # rotated-out keys still accepted, "version:master:iv,..."
 
 # Platform cookies
 YT_COOKIES = os.getenv("YT_COOKIES", YTUB_COOKIES)
@@ -39,6 +41,59 @@ INSTA_COOKIES = os.getenv("INSTA_COOKIES", INST_COOKIES)
 FREEMIUM_LIMIT = int(os.getenv("FREEMIUM_LIMIT", "1000000"))
 PREMIUM_LIMIT = int(os.getenv("PREMIUM_LIMIT", "10000000"))
 
+# Batch concurrency
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))  # links in flight per user
+GLOBAL_CONCURRENCY = int(os.getenv("GLOBAL_CONCURRENCY", "20"))  # links in flight across all users
+
+# Job runner
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "50"))  # batch, /single and /dl jobs running at once
+BATCH_SLOTS = int(os.getenv("BATCH_SLOTS", "40"))  # at most this many of them batches; the rest stay free for short jobs
+PREMIUM_WEIGHT = int(os.getenv("PREMIUM_WEIGHT", "3"))  # premium picks per free pick when both lanes wait
+
+# Rate limits (per client and chat, within Telegram's documented limits)
+DEST_RATE_PRIVATE = float(os.getenv("DEST_RATE_PRIVATE", "1"))  # messages/second to a private chat
+DEST_RATE_GROUP = float(os.getenv("DEST_RATE_GROUP", str(20 / 60)))  # messages/second to a group or channel
+SOURCE_RATE = float(os.getenv("SOURCE_RATE", "3"))  # fetch calls/second per source chat
+FLOOD_RETRIES = int(os.getenv("FLOOD_RETRIES", "3"))  # retries after a FloodWait
+
+# Batch job store
+JOB_STORE = os.getenv("JOB_STORE", "file")  # "file" journal or "mongo" collection
+JOB_FLUSH_INTERVAL = float(os.getenv("JOB_FLUSH_INTERVAL", "2"))  # seconds between progress checkpoints
+
+# Database writes
+WRITE_BATCH_INTERVAL = float(os.getenv("WRITE_BATCH_INTERVAL", "0.5"))  # seconds a queued write may wait
+WRITE_BATCH_SIZE = int(os.getenv("WRITE_BATCH_SIZE", "500"))  # queued writes that trigger a flush at once
+
+# Transfers
+STREAM_MODE = os.getenv("STREAM_MODE", "true").lower() == "true"  # pipe downloads straight into the upload
+STREAM_BUFFER_MB = int(os.getenv("STREAM_BUFFER_MB", "8"))  # in-memory buffer per streamed file
+DOWNLOAD_CONNECTIONS = int(os.getenv("DOWNLOAD_CONNECTIONS", "4"))  # parallel sessions per large download
+PARALLEL_MIN_MB = int(os.getenv("PARALLEL_MIN_MB", "10"))  # smaller files use a single connection
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", "4"))  # upload parts in flight per file
+
+# Scratch space
+SCRATCH_DIR = os.getenv("SCRATCH_DIR", "scratch")  # per-job working directories live here
+SCRATCH_BUDGET_MB = int(os.getenv("SCRATCH_BUDGET_MB", "20480"))  # bytes reserved across all jobs
+SCRATCH_MIN_FREE_MB = int(os.getenv("SCRATCH_MIN_FREE_MB", "1024"))  # disk space always left free
+SCRATCH_CLEAN_INTERVAL = int(os.getenv("SCRATCH_CLEAN_INTERVAL", "3600"))  # seconds between orphan sweeps
+
+# User client pool
+POOL_MAX_CLIENTS = int(os.getenv("POOL_MAX_CLIENTS", "200"))  # started user clients (and custom bots) at once
+POOL_IDLE_TIMEOUT = int(os.getenv("POOL_IDLE_TIMEOUT", "900"))  # seconds before an unused client is stopped
+
+# Progress messages
+PROGRESS_INTERVAL = float(os.getenv("PROGRESS_INTERVAL", "5"))  # minimum seconds between edits of one status message
+
+# Caching
+SETTINGS_CACHE_TTL = int(os.getenv("SETTINGS_CACHE_TTL", "300"))  # seconds
+PEER_CACHE_SIZE = int(os.getenv("PEER_CACHE_SIZE", "1000"))  # resolved private chats per client
+DEST_CACHE_TTL = int(os.getenv("DEST_CACHE_TTL", "3600"))  # validated destination chats
+DEST_NEGATIVE_TTL = int(os.getenv("DEST_NEGATIVE_TTL", "60"))  # unreachable destination chats
+DIALOG_CACHE_TTL = int(os.getenv("DIALOG_CACHE_TTL", "1800"))  # seconds a user's dialog sync is trusted
+FILE_CACHE = os.getenv("FILE_CACHE", "true").lower() == "true"  # reuse file_ids of earlier uploads
+PREMIUM_NEGATIVE_TTL = int(os.getenv("PREMIUM_NEGATIVE_TTL", "60"))  # seconds a "not premium" answer is trusted
+PREMIUM_WATCH = os.getenv("PREMIUM_WATCH", "false").lower() == "true"  # follow premium changes of other instances (replica set only)
+
 # Links
 JOIN_LINK = os.getenv("JOIN_LINK", "https://t.me/Era_Bot_Support")
 ADMIN_CONTACT = os.getenv("ADMIN_CONTACT", "https://t.me/Yae_X_Miko")
@@ -111,11 +111,47 @@ async def load_plugins():
         logger.error(f"Error loading plugins: {e}")
         return False
 
+async def prepare_database():
+    """Set up the database once, before any handler runs a query"""
+    from utils.func import ensure_indexes, start_premium_watcher
+    from config import PREMIUM_WATCH
+    await ensure_indexes()
+    if PREMIUM_WATCH:
+        # Keep cached premium status in step with other instances
+        start_premium_watcher()
+
+async def resume_jobs():
+    """Resume batch jobs interrupted by the last shutdown"""
+    try:
+        from plugins.batch import resume_batches
+        resumed = await resume_batches()
+        if resumed:
+            logger.info(f"Resumed {resumed} interrupted batch job(s)")
+    except Exception as e:
+        logger.error(f"Error resuming batch jobs: {e}")
+
+async def save_jobs():
+    """Stop running jobs and checkpoint them while their clients are still connected"""
+    try:
+        from utils.runner import runner, batch_runner
+        await asyncio.gather(runner.stop(), batch_runner.stop())
+    except Exception as e:
+        logger.error(f"Error stopping jobs: {e}")
+    try:
+        from plugins.batch import save_batches
+        await save_batches()
+    except Exception as e:
+        logger.error(f"Error saving batch jobs: {e}")
+
 async def shutdown_clients():
     """Gracefully shutdown all clients"""
     logger.info("Shutting down clients...")
     
-    # Stop clients first
+    # Jobs first: a batch still running against stopped clients would
+    # count every remaining link as failed and checkpoint it as done
+    await save_jobs()
+    
+    # Stop clients
     for client in clients:
         try:
             if hasattr(client, 'stop'):
@@ -127,6 +163,14 @@ async def shutdown_clients():
         except Exception as e:
             logger.error(f"Error stopping client: {e}")
     
+    # Stop pooled user clients and custom bots
+    try:
+        from plugins.batch import UB, UC
+        await UC.close()
+        await UB.close()
+    except Exception as e:
+        logger.error(f"Error stopping pooled clients: {e}")
+    
     # Wait a bit for cleanup
     await asyncio.sleep(1)
     
@@ -153,6 +197,10 @@ async def shutdown_clients():
                 )
             except asyncio.TimeoutError:
                 logger.warning("Some tasks didn't complete cancellation in time")
+        
+        # Write out queued database writes
+        from utils.writebatch import writes
+        await writes.flush()
     
     except Exception as e:
         logger.error(f"Error during shutdown: {e}")
@@ -172,6 +220,9 @@ async def main():
             logger.error("Dependency check failed. Exiting.")
             return 1
         
+        # Indexes first, so the first lookups are not collection scans
+        await prepare_database()
+        
         # Start clients
         logger.info("Starting clients...")
         if not await start_clients():
@@ -183,6 +234,13 @@ async def main():
         if not await load_plugins():
             logger.warning("Some plugins failed to load, but continuing...")
         
+        # Sweep scratch files left by the last run, then on a schedule
+        from utils.scratch import scratch
+        scratch.start()
+        
+        # Continue batches interrupted by a restart or redeploy
+        await resume_jobs()
+        
         logger.info("🚀 Bot is running! Press Ctrl+C to stop.")
         
         # Keep the bot running with proper shutdown handling
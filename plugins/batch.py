@@ -3,66 +3,109 @@
 # See LICENSE file in the repository root for full license text.
 
 import os, re, time, asyncio, json, asyncio 
+import weakref
+from contextlib import asynccontextmanager
+from functools import partial
+from itertools import islice
+from collections import OrderedDict
 from pyrogram import Client, filters
-from pyrogram.types import Message
-from pyrogram.errors import UserNotParticipant
+from pyrogram.types import Message, InputMediaPhoto, InputMediaVideo, InputMediaDocument, InputMediaAudio
+from pyrogram.errors import UserNotParticipant, Forbidden, ChatAdminRequired, ChannelPrivate, PeerIdInvalid
+from pyrogram.errors import ChatIdInvalid, ChannelInvalid, UsernameInvalid, UsernameNotOccupied
 from config import API_ID, API_HASH, LOG_GROUP, STRING, FORCE_SUB, FREEMIUM_LIMIT, PREMIUM_LIMIT
-from utils.func import get_user_data, screenshot, thumbnail, get_video_metadata
+from config import BATCH_CONCURRENCY, GLOBAL_CONCURRENCY, STREAM_MODE, PEER_CACHE_SIZE
+from config import DEST_CACHE_TTL, DEST_NEGATIVE_TTL, DIALOG_CACHE_TTL, POOL_MAX_CLIENTS
+from utils.func import screenshot, thumbnail, get_video_metadata
 from utils.func import get_user_data_key, process_text_with_rules, is_premium_user, E
+from utils.func import get_user_settings, UserSettings, read_lines
+from dataclasses import asdict
 from shared_client import app as X
 from plugins.settings import rename_file
 from plugins.start import subscribe as sub
 from utils.custom_filters import login_in_progress
-from utils.encrypt import dcs
+from utils.encrypt import adcs
+from utils.transfer import can_stream, stream_transfer, send_uploaded, downloads
+from utils.parallel import scratch_download, parallel_upload, parallel_stream, wants_parallel
+from utils.scratch import scratch
+from utils.filecache import get_cached_file, cache_file, forget_cached_file, file_variant, source_unique_id
+from utils.jobstore import create_job_store
+from utils.jobstate import LinkSet
+from utils.ratelimit import scheduler
+from utils.runner import runner, batch_runner
+from utils.ordering import DeliveryOrder, current_turn, wait_turn
+from utils.clientpool import ClientPool
+from utils.progress import get_reporter, discard_reporter, progress_bar, format_eta
 from typing import Dict, Any, Optional
 import logging
 
 logger = logging.getLogger(__name__)
 
 Y = None if not STRING else __import__('shared_client').userbot
-Z, P, UB, UC, emp = {}, {}, {}, {}, {}
+Z, emp = {}, {}
+
+# user id -> (synced_at, {chat id: top message id}, peer rows) of the last dialog sync,
+# least recently used first; kept across pool evictions, dropped on logout
+DIALOGS = OrderedDict()
+
+def forget_dialogs(uid):
+    DIALOGS.pop(uid, None)
+
+# Started custom bots and user session clients, bounded and evicted when idle
+UB = ClientPool("bot")
+UC = ClientPool("user", on_remove=forget_dialogs)
+
+# Pooled clients only fetch and send: no update stream to decode, one
+# handler worker, and no session file on disk
+HELPER_CLIENT_OPTS = {"no_updates": True, "workers": 1, "in_memory": True}
 
-ACTIVE_USERS = {}
 ACTIVE_USERS_FILE = "active_users.json"
+ACTIVE_USERS_JOURNAL = "active_users.journal"
+BATCH_FILES_DIR = "batch_files"  # uploaded .txt link lists of running batches
+STORE = create_job_store(ACTIVE_USERS_JOURNAL, ACTIVE_USERS_FILE)
+ACTIVE_USERS = STORE.load_sync()
 ongoing_downloads = {}
 
+# client -> OrderedDict(chat id -> resolved id) and client -> chats already dialog-synced
+PEERS = weakref.WeakKeyDictionary()
+SYNCED = weakref.WeakKeyDictionary()
+
+# Client warm-ups started at /batch and /single, referenced until done
+WARMING = set()
+
+# client -> {raw destination: (expires_at, chat_id, topic_id)}
+DESTS = weakref.WeakKeyDictionary()
+PERMISSION_ERRORS = (Forbidden, ChatAdminRequired, ChannelPrivate, PeerIdInvalid)
+# Destinations that will not work until the user changes them; anything else may be transient
+DEST_INVALID_ERRORS = PERMISSION_ERRORS + (ChatIdInvalid, ChannelInvalid, UsernameInvalid, UsernameNotOccupied, KeyError, ValueError)
+
+# Telegram returns at most this many messages per get_messages call
+FETCH_CHUNK = 200
+FETCH_RETRY_DELAY = 5  # seconds before a failed prefetch is tried once more
+# Prefetch placeholder for a message that could not be fetched (as opposed to a deleted one)
+UNFETCHED = object()
+
+# Caps links in flight across every user's batch
+GLOBAL_SEMAPHORE = asyncio.Semaphore(GLOBAL_CONCURRENCY)
+
 # fixed directory file_name problems 
 def sanitize(filename):
     return re.sub(r'[<>:"/\\|?*\']', '_', filename).strip(" .")[:255]
 
-def load_active_users():
-    try:
-        if os.path.exists(ACTIVE_USERS_FILE):
-            with open(ACTIVE_USERS_FILE, 'r') as f:
-                return json.load(f)
-        return {}
-    except Exception:
-        return {}
-
-async def save_active_users_to_file():
-    try:
-        with open(ACTIVE_USERS_FILE, 'w') as f:
-            json.dump(ACTIVE_USERS, f)
-    except Exception as e:
-        logger.error(f"Error saving active users: {e}")
-
 async def add_active_batch(user_id: int, batch_info: Dict[str, Any]):
-    ACTIVE_USERS[str(user_id)] = batch_info
-    await save_active_users_to_file()
+    await STORE.put(str(user_id), batch_info)
 
 def is_user_active(user_id: int) -> bool:
     return str(user_id) in ACTIVE_USERS
 
-async def update_batch_progress(user_id: int, current: int, success: int):
-    if str(user_id) in ACTIVE_USERS:
-        ACTIVE_USERS[str(user_id)]["current"] = current
-        ACTIVE_USERS[str(user_id)]["success"] = success
-        await save_active_users_to_file()
+async def update_batch_progress(user_id: int, indices, success: int):
+    # Coalesced in memory; the job store checkpoints it on its next flush
+    STORE.mark(str(user_id), indices)
+    STORE.update(str(user_id), success=success)
 
 async def request_batch_cancel(user_id: int):
     if str(user_id) in ACTIVE_USERS:
-        ACTIVE_USERS[str(user_id)]["cancel_requested"] = True
-        await save_active_users_to_file()
+        STORE.update(str(user_id), cancel_requested=True)
+        await STORE.flush()
         return True
     return False
 
@@ -72,133 +115,281 @@ def should_cancel(user_id: int) -> bool:
 
 async def remove_active_batch(user_id: int):
     if str(user_id) in ACTIVE_USERS:
-        del ACTIVE_USERS[str(user_id)]
-        await save_active_users_to_file()
+        source_file = ACTIVE_USERS[str(user_id)].get("source_file")
+        await STORE.remove(str(user_id))
+        if source_file and os.path.exists(source_file):
+            os.remove(source_file)
 
 def get_batch_info(user_id: int) -> Optional[Dict[str, Any]]:
     return ACTIVE_USERS.get(str(user_id))
 
-ACTIVE_USERS = load_active_users()
+async def upd_dlg(uid, c):
+    """Teach a freshly started client the user's recent chats.
 
-async def upd_dlg(c):
+    Peers from the last sync are replayed into the client's storage without
+    a network call. When that sync is older than DIALOG_CACHE_TTL, dialogs
+    are walked newest first only until one whose top message is unchanged.
+    """
+    cached = DIALOGS.get(uid)
+    if cached:
+        DIALOGS.move_to_end(uid)
+        await c.storage.update_peers(cached[2])
+        if time.time() - cached[0] < DIALOG_CACHE_TTL:
+            return True
+    known = cached[1] if cached else {}
+    tops = {}
     try:
-        async for _ in c.get_dialogs(limit=100): pass
-        return True
+        async for d in c.get_dialogs(limit=100):
+            top = d.top_message.id if d.top_message else 0
+            # Pinned dialogs are listed first whatever their age
+            if not d.is_pinned and known.get(d.chat.id) == top:
+                break
+            tops[d.chat.id] = top
     except Exception as e:
         logger.error(f'Failed to update dialogs: {e}')
         return False
+    DIALOGS[uid] = (time.time(), {**known, **tops}, peer_rows(c))
+    DIALOGS.move_to_end(uid)
+    while len(DIALOGS) > POOL_MAX_CLIENTS:
+        DIALOGS.popitem(last=False)
+    return True
 
-async def get_msg(c, u, i, d, lt):
+def peer_rows(c):
+    """Snapshot of the client's peers table, in the row shape update_peers takes.
+
+    Reads the SQLite storage of Pyrogram 2.0 (pinned in requirements.txt);
+    any other storage just skips the replay.
+    """
+    conn = getattr(c.storage, "conn", None)
+    if conn is None:
+        return []
     try:
-        if lt == 'public':
+        return conn.execute("SELECT id, access_hash, type, username, phone_number FROM peers").fetchall()
+    except Exception as e:
+        logger.warning(f'Cannot snapshot peers: {e}')
+        return []
+
+async def resolve_chat(u, i):
+    """Resolve a private chat id to a working route for client u.
+
+    Results are kept in a per-client LRU; dialogs are synced only on a miss
+    and at most once per chat for the lifetime of the client.
+    """
+    cache = PEERS.setdefault(u, OrderedDict())
+    key = str(i)
+    if key in cache:
+        cache.move_to_end(key)
+        return cache[key]
+
+    chat_id = i if str(i).startswith('-100') else f'-100{i}' if i.isdigit() else i
+    synced = SYNCED.setdefault(u, set())
+    while True:
+        try:
+            peer = await u.resolve_peer(chat_id)
+            if hasattr(peer, 'channel_id'): resolved_id = f'-100{peer.channel_id}'
+            elif hasattr(peer, 'chat_id'): resolved_id = f'-{peer.chat_id}'
+            elif hasattr(peer, 'user_id'): resolved_id = peer.user_id
+            else: resolved_id = chat_id
+            break
+        except Exception:
             try:
-                xm = await c.get_messages(i, d)
-                emp[i] = getattr(xm, "empty", False)
-                if emp[i]:
-                    try: await u.join_chat(i)
-                    except: pass
-                    xm = await u.get_messages((await u.get_chat(f"@{i}")).id, d)
-                return xm
+                resolved_id = (await u.get_chat(chat_id)).id
+                break
+            except Exception:
+                if key in synced:
+                    raise
+                synced.add(key)
+                async for _ in u.get_dialogs(limit=200): pass
+
+    cache[key] = resolved_id
+    if len(cache) > PEER_CACHE_SIZE:
+        cache.popitem(last=False)
+    return resolved_id
+
+def forget_chat(u, i):
+    PEERS.get(u, {}).pop(str(i), None)
+
+async def get_msg(c, u, i, d, lt):
+    return (await get_msgs(c, u, i, [d], lt)).get(d)
+
+def _by_id(ids, xs):
+    """Map requested ids to fetched messages, dropping deleted/empty ones"""
+    if not isinstance(xs, list): xs = [xs]
+    got = {x.id: x for x in xs if x and not getattr(x, "empty", False)}
+    return {d: got.get(d) for d in ids}
+
+async def get_msgs(c, u, i, ids, lt):
+    """Fetch up to FETCH_CHUNK messages of one chat in a single call; returns {id: msg or None}.
+
+    None means the message is deleted or empty. A failed fetch raises, so
+    the caller can tell a transient error from a missing message.
+    """
+    if lt == 'public':
+        try:
+            res = _by_id(ids, await scheduler.fetch(c, i, c.get_messages, i, ids))
+        except Exception as e:
+            logger.error(f'Error fetching public message: {e}')
+            raise
+        missing = [d for d in ids if res[d] is None]
+        emp[i] = bool(missing)
+        if missing and u:
+            try: await u.join_chat(i)
+            except: pass
+            try:
+                chat_id = (await u.get_chat(f"@{i}")).id
+                res.update(_by_id(missing, await scheduler.fetch(u, chat_id, u.get_messages, chat_id, missing)))
             except Exception as e:
-                logger.error(f'Error fetching public message: {e}')
-                return None
-        else:
-            if u:
+                # Keep what the bot fetched; only the missing ids stay None
+                logger.error(f'Error fetching public message with user client: {e}')
+        return res
+    if not u:
+        # No client can read a private chat
+        return dict.fromkeys(ids)
+    try:
+        resolved_id = await resolve_chat(u, i)
+        return _by_id(ids, await scheduler.fetch(u, resolved_id, u.get_messages, resolved_id, ids))
+    except Exception as e:
+        forget_chat(u, i)
+        logger.error(f'Private channel error: {e}')
+        raise
+
+async def prefetch_links(c, u, window):
+    """Group a window of (index, link) pairs by source chat and fetch each group in one call.
+
+    Returns [(index, link, msg)] in the original order; msg is None when the
+    link is invalid or the message is deleted/empty, and UNFETCHED when the
+    fetch failed twice, for the caller to fetch the link on its own.
+    """
+    groups = {}
+    parsed = []
+    for i, link in window:
+        chat_id, msg_id, link_type = E(link)
+        parsed.append((i, link, chat_id, msg_id))
+        if chat_id and msg_id:
+            groups.setdefault((chat_id, link_type), []).append(msg_id)
+
+    fetched = {}
+    for (chat_id, link_type), ids in groups.items():
+        ids = list(dict.fromkeys(ids))
+        for n in range(0, len(ids), FETCH_CHUNK):
+            chunk = ids[n:n + FETCH_CHUNK]
+            try:
+                res = await get_msgs(c, u, chat_id, chunk, link_type)
+            except Exception:
+                await asyncio.sleep(FETCH_RETRY_DELAY)
                 try:
-                    async for _ in u.get_dialogs(limit=50): pass
-                    chat_id = i if str(i).startswith('-100') else f'-100{i}' if i.isdigit() else i
-                    try:
-                        peer = await u.resolve_peer(chat_id)
-                        if hasattr(peer, 'channel_id'): resolved_id = f'-100{peer.channel_id}'
-                        elif hasattr(peer, 'chat_id'): resolved_id = f'-{peer.chat_id}'
-                        elif hasattr(peer, 'user_id'): resolved_id = peer.user_id
-                        else: resolved_id = chat_id
-                        return await u.get_messages(resolved_id, d)
-                    except Exception:
-                        try:
-                            chat = await u.get_chat(chat_id)
-                            return await u.get_messages(chat.id, d)
-                        except Exception:
-                            async for _ in u.get_dialogs(limit=200): pass
-                            return await u.get_messages(chat_id, d)
+                    res = await get_msgs(c, u, chat_id, chunk, link_type)
                 except Exception as e:
-                    logger.error(f'Private channel error: {e}')
-                    return None
-            return None
-    except Exception as e:
-        logger.error(f'Error fetching message: {e}')
-        return None
+                    logger.warning(f'Prefetch of {len(chunk)} messages from {chat_id} failed, fetching them one by one: {e}')
+                    res = dict.fromkeys(chunk, UNFETCHED)
+            fetched.update({(chat_id, d): m for d, m in res.items()})
 
-async def get_ubot(uid):
+    return [(i, link, fetched.get((chat_id, msg_id))) for i, link, chat_id, msg_id in parsed]
+
+async def start_ubot(uid):
     bt = await get_user_data_key(uid, "bot_token", None)
     if not bt: return None
-    if uid in UB: return UB.get(uid)
     try:
-        bot = Client(f"user_{uid}", bot_token=bt, api_id=API_ID, api_hash=API_HASH)
+        bot = Client(f"user_{uid}", bot_token=bt, api_id=API_ID, api_hash=API_HASH, **HELPER_CLIENT_OPTS)
         await bot.start()
-        UB[uid] = bot
         return bot
     except Exception as e:
         logger.error(f"Error starting bot for user {uid}: {e}")
         return None
 
+async def start_uclient(uid):
+    xxx = await get_user_data_key(uid, "session_string", None)
+    if not xxx: return None
+    try:
+        ss = await adcs(xxx)
+        gg = Client(f'{uid}_client', api_id=API_ID, api_hash=API_HASH, device_model="v3saver", session_string=ss, **HELPER_CLIENT_OPTS)
+        await gg.start()
+        await upd_dlg(uid, gg)
+        return gg
+    except Exception as e:
+        logger.error(f'User client error: {e}')
+        return None
+
+async def get_ubot(uid):
+    return await UB.get(uid, partial(start_ubot, uid))
+
 async def get_uclient(uid):
-    ud = await get_user_data(uid)
-    ubot = UB.get(uid)
-    cl = UC.get(uid)
-    if cl: return cl
-    if not ud: return ubot if ubot else None
-    xxx = ud.get('session_string')
-    if xxx:
-        try:
-            ss = dcs(xxx)
-            gg = Client(f'{uid}_client', api_id=API_ID, api_hash=API_HASH, device_model="v3saver", session_string=ss)
-            await gg.start()
-            await upd_dlg(gg)
-            UC[uid] = gg
-            return gg
-        except Exception as e:
-            logger.error(f'User client error: {e}')
-            return ubot if ubot else Y
-    return Y
+    """The user's own session client, else their started custom bot, else the shared userbot"""
+    return await UC.get(uid, partial(start_uclient, uid)) or UB.peek(uid) or Y
+
+def warm_uclient(uid):
+    """Start the user's client and dialog sync in the background while they type links"""
+    if uid in UC:
+        return
+    task = asyncio.create_task(get_uclient(uid))
+    WARMING.add(task)
+    task.add_done_callback(WARMING.discard)
+
+@asynccontextmanager
+async def uclient_lease(uid):
+    """get_uclient, keeping the user's client out of eviction until the block ends"""
+    async with UC.lease(uid, partial(start_uclient, uid)) as cl:
+        yield cl or UB.peek(uid) or Y
 
 async def prog(c, t, C, h, m, st):
-    global P
-    p = c / t * 100
-    interval = 10 if t >= 100 * 1024 * 1024 else 20 if t >= 50 * 1024 * 1024 else 30 if t >= 10 * 1024 * 1024 else 50
-    step = int(p // interval) * interval
-    if m not in P or P[m] != step or p >= 100:
-        P[m] = step
-        c_mb = c / (1024 * 1024)
-        t_mb = t / (1024 * 1024)
-        bar = '🟢' * int(p / 10) + '🔴' * (10 - int(p / 10))
-        speed = c / (time.time() - st) / (1024 * 1024) if time.time() > st else 0
-        eta = time.strftime('%M:%S', time.gmtime((t - c) / (speed * 1024 * 1024))) if speed > 0 else '00:00'
-        await C.edit_message_text(h, m, f"__**Pyro Handler...**__\n\n{bar}\n\n⚡**__Completed__**: {c_mb:.2f} MB / {t_mb:.2f} MB\n📊 **__Done__**: {p:.2f}%\n🚀 **__Speed__**: {speed:.2f} MB/s\n⏳ **__ETA__**: {eta}\n\n**__Powered by Team SPY__**")
-        if p >= 100: P.pop(m, None)
+    p = c / t * 100 if t else 0
+    reporter = get_reporter((id(C), h, m), lambda text: C.edit_message_text(h, m, text))
+    speed, eta = reporter.transfer(c, t)
+    c_mb = c / (1024 * 1024)
+    t_mb = t / (1024 * 1024)
+    text = f"__**Pyro Handler...**__\n\n{progress_bar(p)}\n\n⚡**__Completed__**: {c_mb:.2f} MB / {t_mb:.2f} MB\n📊 **__Done__**: {p:.2f}%\n🚀 **__Speed__**: {speed / (1024 * 1024):.2f} MB/s\n⏳ **__ETA__**: {format_eta(eta)}\n\n**__Powered by Team SPY__**"
+    await reporter.update(text, force=p >= 100)
+
+def parse_destination(tcid):
+    """Split a configured chat id into (chat, topic); accepts -100CHANNELID/TOPIC_ID and @usernames"""
+    if not isinstance(tcid, str):
+        return tcid, None
+    chat, _, topic = tcid.strip().partition('/')
+    topic = int(topic) if topic.isdigit() else None
+    if chat.startswith('@'):
+        return chat, topic
+    try:
+        return int(chat), topic
+    except ValueError:
+        return None, None
+
+async def resolve_destination(c, tcid):
+    """Validate a destination for client c; returns (chat_id, topic_id) or (None, None).
+
+    Results are cached per (client, raw chat id string), failures only briefly.
+    Transient errors (FloodWait, network) are raised and not cached, so the
+    item fails instead of silently going to the user's DM.
+    """
+    cache = DESTS.setdefault(c, {})
+    key = str(tcid)
+    hit = cache.get(key)
+    if hit and hit[0] > time.monotonic():
+        return hit[1], hit[2]
+
+    chat, topic = parse_destination(tcid)
+    chat_id = None
+    if chat is not None:
+        try:
+            # Try to get chat info to validate
+            chat_id = (await c.get_chat(chat)).id  # Return the actual chat ID
+        except DEST_INVALID_ERRORS as e:
+            logger.error(f"Cannot access target chat {tcid}: {e}")
+
+    if chat_id is None:
+        cache[key] = (time.monotonic() + DEST_NEGATIVE_TTL, None, None)
+        return None, None
+    cache[key] = (time.monotonic() + DEST_CACHE_TTL, chat_id, topic)
+    return chat_id, topic
+
+def invalidate_destination(c, chat_id):
+    """Drop every cached route of client c that points at chat_id"""
+    cache = DESTS.get(c, {})
+    for key in [k for k, v in cache.items() if v[1] == chat_id or k == str(chat_id)]:
+        cache.pop(key, None)
 
 async def validate_chat_id(c, tcid):
     """Validate and fix chat ID format"""
-    try:
-        # Convert chat ID to proper format
-        if isinstance(tcid, str):
-            if tcid.startswith('-100'):
-                tcid = int(tcid)
-            elif tcid.startswith('@'):
-                pass  # Username format is fine
-            else:
-                try:
-                    tcid = int(tcid)
-                except:
-                    return None
-        
-        # Try to get chat info to validate
-        chat_info = await c.get_chat(tcid)
-        return chat_info.id  # Return the actual chat ID
-        
-    except Exception as e:
-        logger.error(f"Cannot access target chat {tcid}: {e}")
-        return None
+    return (await resolve_destination(c, tcid))[0]
 
 async def send_direct(c, m, tcid, ft=None, rtmid=None):
     try:
@@ -209,32 +400,133 @@ async def send_direct(c, m, tcid, ft=None, rtmid=None):
         
         tcid = validated_chat
         
-        # Send the message based on type
-        if m.video:
-            await c.send_video(tcid, m.video.file_id, caption=ft, duration=m.video.duration, width=m.video.width, height=m.video.height, reply_to_message_id=rtmid)
-        elif m.video_note:
-            await c.send_video_note(tcid, m.video_note.file_id, duration=m.video_note.duration, length=m.video_note.length, reply_to_message_id=rtmid)
-        elif m.animation:
-            await c.send_animation(tcid, m.animation.file_id, duration=m.animation.duration, width=m.animation.width, height=m.animation.height, caption=ft, reply_to_message_id=rtmid)
-        elif m.sticker:
-            await c.send_sticker(tcid, m.sticker.file_id, reply_to_message_id=rtmid)
-        elif m.document:
-            await c.send_document(tcid, m.document.file_id, caption=ft, reply_to_message_id=rtmid)
-        elif m.audio:
-            await c.send_audio(tcid, m.audio.file_id, caption=ft, duration=m.audio.duration, performer=m.audio.performer, title=m.audio.title, reply_to_message_id=rtmid)
-        elif m.voice:
-            await c.send_voice(tcid, m.voice.file_id, caption=ft, duration=m.voice.duration, reply_to_message_id=rtmid)
-        elif m.photo:
-            await c.send_photo(tcid, m.photo.file_id, caption=ft, reply_to_message_id=rtmid)
-        elif m.text:
-            await c.send_message(tcid, ft if ft else m.text, reply_to_message_id=rtmid)
-            
+        # Send the message based on type, paced per destination chat
+        async def _send():
+            if m.video:
+                await c.send_video(tcid, m.video.file_id, caption=ft, duration=m.video.duration, width=m.video.width, height=m.video.height, reply_to_message_id=rtmid)
+            elif m.video_note:
+                await c.send_video_note(tcid, m.video_note.file_id, duration=m.video_note.duration, length=m.video_note.length, reply_to_message_id=rtmid)
+            elif m.animation:
+                await c.send_animation(tcid, m.animation.file_id, duration=m.animation.duration, width=m.animation.width, height=m.animation.height, caption=ft, reply_to_message_id=rtmid)
+            elif m.sticker:
+                await c.send_sticker(tcid, m.sticker.file_id, reply_to_message_id=rtmid)
+            elif m.document:
+                await c.send_document(tcid, m.document.file_id, caption=ft, reply_to_message_id=rtmid)
+            elif m.audio:
+                await c.send_audio(tcid, m.audio.file_id, caption=ft, duration=m.audio.duration, performer=m.audio.performer, title=m.audio.title, reply_to_message_id=rtmid)
+            elif m.voice:
+                await c.send_voice(tcid, m.voice.file_id, caption=ft, duration=m.voice.duration, reply_to_message_id=rtmid)
+            elif m.photo:
+                await c.send_photo(tcid, m.photo.file_id, caption=ft, reply_to_message_id=rtmid)
+            elif m.text:
+                await c.send_message(tcid, ft if ft else m.text, reply_to_message_id=rtmid)
+
+        await wait_turn()
+        await scheduler.send(c, tcid, _send)
+
     except Exception as e:
         logger.error(f"Error sending direct: {e}")
+        if isinstance(e, PERMISSION_ERRORS):
+            invalidate_destination(c, tcid)
         raise Exception(f"Failed to send message: {str(e)}")
 
-async def handle_file_download(c, m, tcid, uid, ft=None, rtmid=None):
+def target_file_name(m, rename_tag=None):
+    """Local file name for a downloaded media message, with the rename tag applied"""
+    if m.document:
+        file_name = m.document.file_name or "document"
+    elif m.video:
+        file_name = f"video_{int(time.time())}.mp4"
+    elif m.audio:
+        file_name = m.audio.file_name or f"audio_{int(time.time())}.mp3"
+    elif m.photo:
+        file_name = f"photo_{int(time.time())}.jpg"
+    else:
+        file_name = f"file_{int(time.time())}"
+
+    # Apply rename tag
+    if rename_tag:
+        file_extension = os.path.splitext(file_name)[1]
+        file_name = f"{rename_tag}{file_extension}"
+
+    # Sanitize filename
+    return sanitize(file_name)
+
+def album_media(m, media, caption=None):
+    """Build the InputMedia item of one album message from a file_id or local path"""
+    if m.photo:
+        return InputMediaPhoto(media, caption=caption)
+    if m.video:
+        return InputMediaVideo(media, caption=caption, duration=m.video.duration, width=m.video.width, height=m.video.height)
+    if m.audio:
+        return InputMediaAudio(media, caption=caption, duration=m.audio.duration, performer=m.audio.performer, title=m.audio.title)
+    if m.document:
+        return InputMediaDocument(media, caption=caption)
+    return None
+
+async def send_album(c, msgs, tcid, uid, captions, rtmid=None, settings=None):
+    """Deliver a media group with a single send_media_group call.
+
+    Items are sent by file_id unless a rename tag forces a download, in which
+    case each item is downloaded once and the group is uploaded together.
+    """
+    validated_chat = await validate_chat_id(c, tcid)
+    if not validated_chat:
+        raise Exception(f"Cannot access target chat {tcid}. Bot may not have permission.")
+    tcid = validated_chat
+
+    if settings is None:
+        settings = await get_user_settings(uid)
+    rename_tag = settings.rename_tag
+
+    downloaded = []
+    try:
+        media = []
+        for n, (m, ft) in enumerate(zip(msgs, captions)):
+            if rename_tag:
+                name = target_file_name(m, f"{rename_tag}_{n + 1}" if len(msgs) > 1 else rename_tag)
+                # Each item in a job directory of its own: two users with the same tag never share a name
+                path = await scratch_download(c, m, name)
+                downloaded.append(path)
+                item = album_media(m, path, ft)
+            else:
+                item = album_media(m, (m.photo or m.video or m.audio or m.document).file_id, ft)
+            if item is None:
+                raise ValueError("Message cannot be part of a media group")
+            media.append(item)
+
+        await wait_turn()
+        await scheduler.send(c, tcid, c.send_media_group, tcid, media, reply_to_message_id=rtmid)
+    except Exception as e:
+        if isinstance(e, PERMISSION_ERRORS):
+            invalidate_destination(c, tcid)
+        logger.error(f"Album send failed, sending items one by one: {e}")
+        for m, ft in zip(msgs, captions):
+            await send_direct(c, m, tcid, ft, rtmid)
+    finally:
+        for path in downloaded:
+            if path:
+                scratch.discard(path)
+
+async def send_cached(c, m, tcid, variant, ft=None, rtmid=None):
+    """Send an earlier upload of the same file by file_id; False when there is none or it is stale"""
+    file_id = await get_cached_file(c, m, variant)
+    if not file_id:
+        return False
+    try:
+        await wait_turn()
+        await scheduler.send(c, tcid, c.send_cached_media, tcid, file_id, caption=ft, reply_to_message_id=rtmid)
+        return True
+    except Exception as e:
+        logger.warning(f"Cached file_id rejected, uploading again: {e}")
+        await forget_cached_file(c, m, variant)
+        return False
+
+async def handle_file_download(c, m, tcid, uid, ft=None, rtmid=None, settings=None):
     """Handle file download and upload with progress"""
+    # Loaded before the direct-send fallback below can apply: without settings nothing is sent
+    if settings is None:
+        settings = await get_user_settings(uid)
+    status_msg = None
     try:
         # Validate target chat first
         validated_chat = await validate_chat_id(c, tcid)
@@ -245,119 +537,102 @@ async def handle_file_download(c, m, tcid, uid, ft=None, rtmid=None):
         tcid = validated_chat
         
         # Check if file should be downloaded and re-uploaded
-        rename_tag = await get_user_data_key(uid, "rename_tag", None)
+        rename_tag = settings.rename_tag
         
         if rename_tag or ft:
+            # Get file info
+            file_name = target_file_name(m, rename_tag)
+            thumb_path = thumbnail(uid)
+            variant = file_variant(m, rename_tag, thumb_path)
+            
+            # Same source, name and thumbnail uploaded before: only the caption is new
+            if await send_cached(c, m, tcid, variant, ft, rtmid):
+                return
+            
             # Download and re-upload with custom name/caption
-            status_msg = await c.send_message(tcid, "📥 **Downloading file...**", reply_to_message_id=rtmid)
+            status_msg = await scheduler.send(c, tcid, c.send_message, tcid, "📥 **Downloading file...**", reply_to_message_id=rtmid)
             
             # Download file
             start_time = time.time()
             
-            # Get file info
-            if m.document:
-                file_name = m.document.file_name or "document"
-                file_size = m.document.file_size
-            elif m.video:
-                file_name = f"video_{int(time.time())}.mp4"
-                file_size = m.video.file_size
-            elif m.audio:
-                file_name = m.audio.file_name or f"audio_{int(time.time())}.mp3"
-                file_size = m.audio.file_size
-            elif m.photo:
-                file_name = f"photo_{int(time.time())}.jpg"
-                file_size = 0  # Photos don't have file_size
-            else:
-                file_name = f"file_{int(time.time())}"
-                file_size = 0
-            
-            # Apply rename tag
-            if rename_tag:
-                file_extension = os.path.splitext(file_name)[1]
-                file_name = f"{rename_tag}{file_extension}"
-            
-            # Sanitize filename
-            file_name = sanitize(file_name)
+            # Stream straight into the upload when no local file is needed; large files
+            # are fetched over parallel connections, still without touching the disk
+            if STREAM_MODE and can_stream(m, thumb_path):
+                try:
+                    await status_msg.edit("🔁 **Transferring file...**")
+                    sent = await stream_transfer(
+                        c, m, tcid, file_name,
+                        caption=ft,
+                        thumb=thumb_path,
+                        reply_to_message_id=rtmid,
+                        progress=prog,
+                        progress_args=(c, tcid, status_msg.id, start_time),
+                        chunks=parallel_stream(c, m) if wants_parallel(m) else None
+                    )
+                    await cache_file(c, m, variant, sent)
+                    discard_reporter((id(c), tcid, status_msg.id))
+                    await status_msg.delete()
+                    return
+                except Exception as e:
+                    logger.error(f"Streamed transfer failed, falling back to disk: {e}")
             
-            # Download file with progress
+            # Download file with progress; concurrent requests for the same file share one download
+            key = source_unique_id(m)
+            downloaded_file = None
             try:
-                downloaded_file = await c.download_media(
+                downloaded_file = await downloads.acquire(key, partial(
+                    scratch_download,
+                    c,
                     m,
                     file_name=file_name,
                     progress=prog,
                     progress_args=(c, tcid, status_msg.id, start_time)
-                )
+                ))
                 
                 if downloaded_file:
                     await status_msg.edit("📤 **Uploading file...**")
                     
-                    # Upload file
-                    if m.video:
-                        # Get video metadata
-                        duration, width, height = await get_video_metadata(downloaded_file)
-                        thumb_path = await screenshot(downloaded_file, duration, uid)
-                        
-                        await c.send_video(
-                            tcid, 
-                            downloaded_file, 
-                            caption=ft,
-                            duration=duration,
-                            width=width,
-                            height=height,
-                            thumb=thumb_path,
-                            reply_to_message_id=rtmid,
-                            progress=prog,
-                            progress_args=(c, tcid, status_msg.id, time.time())
-                        )
-                        
-                        # Clean up
-                        if thumb_path and os.path.exists(thumb_path):
-                            os.remove(thumb_path)
-                            
-                    elif m.document:
-                        thumb_path = thumbnail(uid)
-                        await c.send_document(
+                    await wait_turn()
+                    if m.photo:
+                        sent = await scheduler.send(
+                            c, tcid, c.send_photo,
                             tcid, 
                             downloaded_file, 
                             caption=ft,
-                            thumb=thumb_path,
-                            reply_to_message_id=rtmid,
-                            progress=prog,
-                            progress_args=(c, tcid, status_msg.id, time.time())
+                            reply_to_message_id=rtmid
                         )
-                        
-                    elif m.audio:
-                        thumb_path = thumbnail(uid)
-                        await c.send_audio(
-                            tcid, 
-                            downloaded_file, 
-                            caption=ft,
-                            thumb=thumb_path,
-                            duration=m.audio.duration,
-                            performer=m.audio.performer,
-                            title=m.audio.title,
-                            reply_to_message_id=rtmid,
+                    else:
+                        if m.video:
+                            # Thumbnail from the downloaded video itself
+                            duration = m.video.duration or (await get_video_metadata(downloaded_file))['duration']
+                            thumb_path = await screenshot(downloaded_file, duration, uid)
+                        # Parts go up concurrently; only the final send is paced and retried
+                        input_file = await parallel_upload(
+                            c,
+                            downloaded_file,
+                            file_name,
                             progress=prog,
                             progress_args=(c, tcid, status_msg.id, time.time())
                         )
-                        
-                    elif m.photo:
-                        await c.send_photo(
-                            tcid, 
-                            downloaded_file, 
-                            caption=ft,
-                            reply_to_message_id=rtmid
-                        )
+                        await wait_turn()
+                        sent = await scheduler.send(c, tcid, send_uploaded, c, tcid, m, input_file, file_name, ft, thumb_path, rtmid)
                     
-                    # Clean up downloaded file
-                    if os.path.exists(downloaded_file):
-                        os.remove(downloaded_file)
+                    await cache_file(c, m, variant, sent)
                     
+                    discard_reporter((id(c), tcid, status_msg.id))
                     await status_msg.delete()
                 
             except Exception as e:
                 logger.error(f"Download/upload error: {e}")
+                if isinstance(e, PERMISSION_ERRORS):
+                    invalidate_destination(c, tcid)
+                discard_reporter((id(c), tcid, status_msg.id))
                 await status_msg.edit(f"❌ **Error:** {str(e)}")
+                raise
+            finally:
+                # The last user of a shared download removes the file
+                if downloaded_file:
+                    downloads.release(key, downloaded_file)
                 
         else:
             # Direct send without download
@@ -365,6 +640,10 @@ async def handle_file_download(c, m, tcid, uid, ft=None, rtmid=None):
             
     except Exception as e:
         logger.error(f"File handling error: {e}")
+        if status_msg is not None:
+            # The download or upload itself failed: count the link as failed rather
+            # than sending the original without the rename and caption
+            raise
         # Fallback to direct send
         await send_direct(c, m, tcid, ft, rtmid)
 
@@ -390,14 +669,18 @@ async def batch_handler(client, message):
         await message.reply("❌ **Batch extraction is only available for premium users.**\n\nUse /plan to see premium plans.")
         return
     
+    # Get the user's client ready while they type the links
+    warm_uclient(user_id)
+    
     # Ask for links
     ask_msg = await message.reply(
-        f"📋 **Send me the links to extract (one per line)**\n\n"
+        f"📋 **Send me the links to extract (one per line) or a .txt file of links**\n\n"
         f"{'🔸 **Premium User**' if is_premium else '🔸 **Free User**'}\n"
         f"📊 **Batch Limit:** {limit} links\n\n"
         f"**Example:**\n"
         f"`https://t.me/channelname/123`\n"
-        f"`https://t.me/c/1234567890/123`\n\n"
+        f"`https://t.me/c/1234567890/123`\n"
+        f"`https://t.me/c/1234567890/100-250` (range)\n\n"
         f"Send /cancel to cancel this operation."
     )
     
@@ -425,159 +708,386 @@ async def handle_batch_links(client, message):
         return
     
     try:
-        # Parse links
-        text = message.text.strip()
-        links = [link.strip() for link in text.split('\n') if link.strip()]
+        # Parse links; ranges are counted here and only expanded while processing
+        lines = [line.strip() for line in message.text.strip().split('\n') if line.strip()]
         
-        if not links:
+        if not lines:
             await message.reply("❌ **No valid links found. Please send links one per line.**")
             return
         
-        # Check limit
-        limit = batch_info.get("limit", FREEMIUM_LIMIT)
-        if len(links) > limit:
-            await message.reply(f"❌ **Too many links! Maximum allowed: {limit}**\n\nSend fewer links or upgrade to premium.")
-            return
-        
-        # Validate links
-        valid_links = []
-        for link in links:
-            if "t.me" in link:
-                valid_links.append(link)
-        
-        if not valid_links:
-            await message.reply("❌ **No valid Telegram links found.**\n\nPlease send valid t.me links.")
-            return
-        
-        # Update batch info
-        batch_info["status"] = "processing"
-        batch_info["links"] = valid_links
-        batch_info["total"] = len(valid_links)
-        await add_active_batch(user_id, batch_info)
-        
-        # Start processing
-        status_msg = await message.reply(
-            f"🚀 **Starting batch extraction...**\n\n"
-            f"📊 **Total Links:** {len(valid_links)}\n"
-            f"⏳ **Status:** Processing...\n\n"
-            f"Use /stop to cancel."
-        )
-        
-        # Process links
-        await process_batch_links(client, message, user_id, valid_links, status_msg)
+        await start_batch(client, message, user_id, batch_info, sources=lines)
         
     except Exception as e:
         logger.error(f"Batch processing error: {e}")
         await message.reply(f"❌ **Error:** {str(e)}")
         await remove_active_batch(user_id)
 
-async def process_batch_links(client, message, user_id, links, status_msg):
-    """Process batch links with cancellation support"""
+@X.on_message(filters.document & filters.private & ~login_in_progress)
+async def handle_batch_file(client, message):
+    user_id = message.from_user.id
+    
+    # Only a .txt list sent while a batch is waiting for links
+    batch_info = get_batch_info(user_id)
+    if not batch_info or batch_info.get("status") != "waiting_for_links":
+        return
+    if not (message.document.file_name or "").lower().endswith(".txt"):
+        await message.reply("❌ **Please send the links as a .txt file, one per line.**")
+        return
+    
     try:
-        total = len(links)
-        success = 0
-        failed = 0
-        
-        for i, link in enumerate(links):
-            # Check for cancellation
-            if should_cancel(user_id) or not is_user_active(user_id):
-                await status_msg.edit(
-                    f"🛑 **Batch cancelled by user**\n\n"
-                    f"📊 **Progress:** {i}/{total}\n"
-                    f"✅ **Success:** {success}\n"
-                    f"❌ **Failed:** {failed}"
-                )
-                break
-            
+        os.makedirs(BATCH_FILES_DIR, exist_ok=True)
+        path = await client.download_media(message, file_name=os.path.abspath(os.path.join(BATCH_FILES_DIR, f"{user_id}.txt")))
+        await start_batch(client, message, user_id, batch_info, source_file=path)
+    except Exception as e:
+        logger.error(f"Batch file error: {e}")
+        await message.reply(f"❌ **Error:** {str(e)}")
+        await remove_active_batch(user_id)
+
+def job_items(job):
+    """The LinkSet of a job; jobs saved before it existed are converted, keeping their checkpoint"""
+    items = job.get("items")
+    if isinstance(items, LinkSet):
+        return items
+    if job.get("source_file") and os.path.exists(job["source_file"]):
+        items = LinkSet.from_lines(read_lines(job["source_file"]))
+    else:
+        items = LinkSet.from_lines(job.get("sources") or job.get("links") or [])
+    for index in range(min(job.get("current", 0), len(items))):
+        items.mark(index)
+    return items
+
+async def start_batch(client, message, user_id, batch_info, sources=None, source_file=None):
+    """Validate the size of a link list and queue the batch"""
+    # Ids are packed once, in a single pass off the event loop; the uploaded file is not needed after that
+    loop = asyncio.get_running_loop()
+    items = await loop.run_in_executor(None, LinkSet.from_lines, read_lines(source_file) if source_file else sources)
+    if source_file: os.remove(source_file)
+    total = len(items) + items.invalid
+    
+    if not total:
+        await message.reply("❌ **No valid Telegram links found.**\n\nPlease send valid t.me links.")
+        return
+    
+    # Check limit
+    limit = batch_info.get("limit", FREEMIUM_LIMIT)
+    if total > limit:
+        await message.reply(f"❌ **Too many links! Maximum allowed: {limit}**\n\nSend fewer links or upgrade to premium.")
+        return
+    
+    # The batch keeps this snapshot, also across a restart
+    try:
+        settings = await get_user_settings(user_id)
+    except Exception:
+        await message.reply("❌ **Could not load your settings. Please try again in a moment.**")
+        return
+    
+    # Start processing
+    status_msg = await message.reply(
+        f"🚀 **Starting batch extraction...**\n\n"
+        f"📊 **Total Links:** {total}\n"
+        f"⏳ **Status:** Processing...\n\n"
+        f"Use /stop to cancel."
+    )
+    
+    # Update batch info with everything needed to resume after a restart
+    batch_info["status"] = "processing"
+    batch_info["items"] = items
+    batch_info["chat_id"] = message.chat.id
+    batch_info["status_msg_id"] = status_msg.id
+    batch_info["settings"] = asdict(settings)
+    await add_active_batch(user_id, batch_info)
+    
+    # Hand the batch to the batch runner so this update worker is freed
+    await batch_runner.enqueue(
+        user_id,
+        lambda: process_batch_links(client, message, user_id, items, status_msg, settings=settings),
+        "batch"
+    )
+
+async def process_batch_links(client, message, user_id, items, status_msg, success=0, settings=None):
+    """Process batch links with a pool of workers and cancellation support.
+
+    A planner prefetches the messages in windows of FETCH_CHUNK links and
+    feeds them to the workers, so most links cost no fetch call of their own.
+    Workers download and upload concurrently, but every item is delivered
+    in source order (see DeliveryOrder).
+    `items` is the job's LinkSet; links already marked done are skipped,
+    which is how a resumed batch continues.
+    """
+    if not isinstance(items, LinkSet):
+        items = LinkSet.from_lines(items)
+    total = len(items) + items.invalid
+    # One settings snapshot for the whole batch
+    if settings is None:
+        try:
+            settings = await get_user_settings(user_id)
+        except Exception as e:
+            await status_msg.edit(f"❌ **Batch failed:** could not load your settings ({e})")
+            await remove_active_batch(user_id)
+            return
+    state = {"done": items.done + items.invalid, "success": success, "failed": items.invalid, "cancelled": False}
+    # All status edits of this batch go through one throttled reporter
+    status = get_reporter(("batch", status_msg.chat.id, status_msg.id), status_msg.edit)
+    workers = max(1, min(BATCH_CONCURRENCY, total))
+    queue = asyncio.Queue(maxsize=FETCH_CHUNK)
+    order = DeliveryOrder()
+    admit = asyncio.Lock()
+    seq = 0
+
+    async def put_item(indices, link, msg):
+        nonlocal seq
+        await queue.put((indices, link, msg, seq))
+        seq += 1
+
+    def cancelled():
+        if should_cancel(user_id) or not is_user_active(user_id):
+            state["cancelled"] = True
+        return state["cancelled"]
+
+    async def mark_done(indices):
+        # Checkpoint exactly the items that finished
+        await update_batch_progress(user_id, indices, state["success"])
+
+    album = []
+
+    def album_key(m):
+        return m.chat.id if m.chat else None, m.media_group_id
+
+    async def flush_album():
+        if not album:
+            return
+        indices = [i for i, _, _ in album]
+        link = album[0][1]
+        msgs = [m for _, _, m in album]
+        album.clear()
+        await put_item(indices, link, msgs if len(msgs) > 1 else msgs[0])
+
+    async def planner(user_client):
+        stopped = False
+        try:
+            pending_links = items.pending()
+            while not cancelled():
+                window = list(islice(pending_links, FETCH_CHUNK))
+                if not window:
+                    break
+                for i, link, msg in await prefetch_links(client, user_client, window):
+                    if msg is UNFETCHED:
+                        try:
+                            chat_id, msg_id, link_type = E(link)
+                            msg = await get_msg(client, user_client, chat_id, msg_id, link_type)
+                        except Exception as e:
+                            # Unreachable, not missing: failed for this run but left pending for a resume
+                            logger.error(f"Error fetching {link}: {e}")
+                            state["failed"] += 1
+                            state["done"] += 1
+                            continue
+                    if msg is None:
+                        # Invalid link or deleted message: no further round trip
+                        state["failed"] += 1
+                        state["done"] += 1
+                        await mark_done([i])
+                        continue
+                    # Collect consecutive items of one media group into a single work item
+                    if album and msg.media_group_id and album_key(album[-1][2]) == album_key(msg):
+                        album.append((i, link, msg))
+                        continue
+                    await flush_album()
+                    if msg.media_group_id:
+                        album.append((i, link, msg))
+                    else:
+                        await put_item([i], link, msg)
+            await flush_album()
+        except asyncio.CancelledError:
+            # The workers are cancelled too; a full queue would never take the sentinels
+            stopped = True
+            raise
+        finally:
+            if not stopped:
+                for _ in range(workers):
+                    await queue.put(None)
+
+    async def worker():
+        while True:
+            # Taken off the queue and admitted under the global cap in order, so the
+            # item whose turn it is to be delivered always holds a slot
+            async with admit:
+                item = await queue.get()
+                if item is None:
+                    break
+                await GLOBAL_SEMAPHORE.acquire()
+            indices, link, msg, item_seq = item
+            count = len(indices)
+            token = current_turn.set((order, item_seq))
+
             try:
+                if cancelled():
+                    continue
+
                 # Update progress
-                await update_batch_progress(user_id, i + 1, success)
-                await status_msg.edit(
+                await status.update(
                     f"🔄 **Processing batch...**\n\n"
-                    f"📊 **Progress:** {i + 1}/{total}\n"
-                    f"✅ **Success:** {success}\n"
-                    f"❌ **Failed:** {failed}\n\n"
+                    f"📊 **Progress:** {state['done']}/{total}\n"
+                    f"✅ **Success:** {state['success']}\n"
+                    f"❌ **Failed:** {state['failed']}\n\n"
                     f"🔗 **Current:** {link[:50]}...\n\n"
                     f"Use /stop to cancel."
                 )
-                
-                # Process single link
-                result = await process_single_link(client, message, user_id, link)
+
+                # Process single link, bounded by the global cap
+                result = await process_single_link(client, message, user_id, link, settings, msg)
                 if result:
-                    success += 1
+                    state["success"] += count
                 else:
-                    failed += 1
-                
-                # Small delay between links
-                await asyncio.sleep(1)
-                
+                    state["failed"] += count
+
+            except asyncio.CancelledError:
+                # Interrupted mid-item: leave it pending for the resumed batch
+                raise
             except Exception as e:
                 logger.error(f"Error processing link {link}: {e}")
-                failed += 1
-                continue
-        
-        # Final status
-        if is_user_active(user_id) and not should_cancel(user_id):
-            await status_msg.edit(
+                state["failed"] += count
+            finally:
+                current_turn.reset(token)
+                GLOBAL_SEMAPHORE.release()
+                order.finish(item_seq)
+            state["done"] += count
+            await mark_done(indices)
+
+    interrupted = False
+    try:
+        # Messages fetched by the user's client are sent by the workers, so hold it for the whole batch
+        async with uclient_lease(user_id) as user_client:
+            await asyncio.gather(planner(user_client), *(worker() for _ in range(workers)))
+
+        if state["cancelled"]:
+            await status.update(
+                f"🛑 **Batch cancelled by user**\n\n"
+                f"📊 **Progress:** {state['done']}/{total}\n"
+                f"✅ **Success:** {state['success']}\n"
+                f"❌ **Failed:** {state['failed']}",
+                force=True
+            )
+        else:
+            # Final status
+            await status.update(
                 f"✅ **Batch completed!**\n\n"
                 f"📊 **Total:** {total}\n"
-                f"✅ **Success:** {success}\n"
-                f"❌ **Failed:** {failed}\n\n"
-                f"**Powered by Team SPY**"
+                f"✅ **Success:** {state['success']}\n"
+                f"❌ **Failed:** {state['failed']}\n\n"
+                f"**Powered by Team SPY**",
+                force=True
             )
-        
+
+    except asyncio.CancelledError:
+        # Interrupted by a shutdown: keep the job so it resumes on the next start
+        interrupted = True
+        raise
     except Exception as e:
         logger.error(f"Batch processing error: {e}")
-        await status_msg.edit(f"❌ **Batch failed:** {str(e)}")
+        await status.update(f"❌ **Batch failed:** {str(e)}", force=True)
     finally:
-        await remove_active_batch(user_id)
+        discard_reporter(("batch", status_msg.chat.id, status_msg.id))
+        if not interrupted:
+            await remove_active_batch(user_id)
+
+async def resume_batches():
+    """Continue batches interrupted by a restart from their last checkpoint"""
+    resumed = 0
+    for uid, job in list(ACTIVE_USERS.items()):
+        if job.get("status") != "processing":
+            continue
+        if not (job.get("items") or job.get("sources") or job.get("source_file") or job.get("links")) or not job.get("chat_id"):
+            # Started before checkpoints carried enough to resume
+            await STORE.remove(uid)
+            continue
+        try:
+            status_msg = await X.get_messages(job["chat_id"], job["status_msg_id"])
+            if not status_msg or status_msg.empty:
+                status_msg = await X.send_message(job["chat_id"], "♻️ **Resuming your batch...**")
+            settings = UserSettings(**job["settings"]) if job.get("settings") else None
+            if not isinstance(job.get("items"), LinkSet):
+                job["items"] = job_items(job)
+                await STORE.put(uid, job)
+            await batch_runner.enqueue(int(uid), partial(
+                process_batch_links, X, status_msg, int(uid), job["items"], status_msg,
+                success=job.get("success", 0), settings=settings
+            ), "batch")
+            resumed += 1
+        except Exception as e:
+            logger.error(f"Error resuming batch for {uid}: {e}")
+    return resumed
+
+async def save_batches():
+    """Write pending checkpoints before the process exits"""
+    await STORE.flush()
+
+async def build_caption(user_id, msg, settings):
+    """Custom caption if set, otherwise the source caption with the user's word rules"""
+    if settings.caption:
+        return settings.caption
+    if msg.caption:
+        return await process_text_with_rules(user_id, msg.caption, settings)
+    return None
 
-async def process_single_link(client, message, user_id, link):
-    """Process a single link and return success status"""
+async def process_single_link(client, message, user_id, link, settings=None, msg=None):
+    """Process a single link and return success status; msg may be prefetched by the batch planner"""
     try:
+        if settings is None:
+            settings = await get_user_settings(user_id)
+        
         # Parse link
         chat_id, msg_id, link_type = E(link)
         if not chat_id or not msg_id:
             return False
         
-        # Get appropriate client
-        user_client = await get_uclient(user_id)
-        if not user_client:
-            return False
-        
-        # Get message
-        msg = await get_msg(client, user_client, chat_id, msg_id, link_type)
-        if not msg:
-            return False
+        if msg is None:
+            # Get appropriate client
+            user_client = await get_uclient(user_id)
+            if not user_client:
+                return False
+
+            # Get message
+            msg = await get_msg(client, user_client, chat_id, msg_id, link_type)
+            if not msg:
+                return False
+
+            # Collect the whole album so it is delivered as one media group
+            if msg.media_group_id:
+                try:
+                    msg = await (getattr(msg, "_client", None) or user_client).get_media_group(msg.chat.id, msg.id)
+                except Exception as e:
+                    logger.error(f"Error fetching media group: {e}")
         
         # Get target chat with proper fallback
-        target_chat = await get_user_data_key(user_id, "chat_id", None)
+        target_chat = settings.chat_id
         if not target_chat:
             target_chat = message.chat.id  # Default to current chat
         
         # Validate target chat and fallback if needed
-        validated_chat = await validate_chat_id(client, target_chat)
+        validated_chat, topic_id = await resolve_destination(client, target_chat)
         if not validated_chat:
-            target_chat = message.chat.id  # Fallback to current chat
+            target_chat, topic_id = message.chat.id, None  # Fallback to current chat
         else:
             target_chat = validated_chat
         
-        # Get custom caption
-        custom_caption = await get_user_data_key(user_id, "caption", None)
-        
-        # Process caption
-        if custom_caption:
-            final_caption = custom_caption
-        elif msg.caption:
-            final_caption = await process_text_with_rules(user_id, msg.caption)
+        if isinstance(msg, list):
+            # Custom caption goes on the first item only, like a regular album
+            if settings.caption:
+                captions = [settings.caption] + [None] * (len(msg) - 1)
+            else:
+                captions = [await build_caption(user_id, m, settings) for m in msg]
+            if len(msg) > 1:
+                await send_album(client, msg, target_chat, user_id, captions, topic_id, settings)
+                return True
+            msg, final_caption = msg[0], captions[0]
         else:
-            final_caption = None
+            final_caption = await build_caption(user_id, msg, settings)
         
         # Check if file needs special handling
         if msg.document or msg.video or msg.audio:
-            await handle_file_download(client, msg, target_chat, user_id, final_caption)
+            await handle_file_download(client, msg, target_chat, user_id, final_caption, topic_id, settings)
         else:
-            await send_direct(client, msg, target_chat, final_caption)
+            await send_direct(client, msg, target_chat, final_caption, topic_id)
         
         return True
         
@@ -624,22 +1134,27 @@ async def single_handler(client, message):
         await message.reply("❌ **Please provide a valid Telegram link.**")
         return
     
+    # Starts while the job waits in the runner queue
+    warm_uclient(user_id)
     status_msg = await message.reply("🔄 **Processing link...**")
     
-    try:
-        result = await process_single_link(client, message, user_id, link)
-        if result:
-            await status_msg.edit("✅ **Link processed successfully!**")
-        else:
-            await status_msg.edit("❌ **Failed to process link.**")
-    except Exception as e:
-        logger.error(f"Single link processing error: {e}")
-        await status_msg.edit(f"❌ **Error:** {str(e)}")
+    async def run():
+        try:
+            # The user's client fetches the message and album; keep it from eviction until the send is done
+            async with uclient_lease(user_id):
+                result = await process_single_link(client, message, user_id, link)
+            if result:
+                await status_msg.edit("✅ **Link processed successfully!**")
+            else:
+                await status_msg.edit("❌ **Failed to process link.**")
+        except Exception as e:
+            logger.error(f"Single link processing error: {e}")
+            await status_msg.edit(f"❌ **Error:** {str(e)}")
 
-# Initialize active users on module load
-ACTIVE_USERS = load_active_users()
+    await runner.enqueue(user_id, run, "single")
 
 # Plugin runner function (if needed by main.py)
 async def run_batch_plugin():
     """Plugin runner function"""
+    await STORE.load()
     logger.info("Batch plugin loaded and ready")
@@ -10,7 +10,7 @@ import os
 from config import API_HASH, API_ID
 from shared_client import app as bot
 from utils.func import save_user_session, get_user_data, remove_user_session, save_user_bot, remove_user_bot
-from utils.encrypt import ecs, dcs
+from utils.encrypt import aecs, adcs
 from plugins.batch import UB, UC
 from utils.custom_filters import login_in_progress, set_user_step, get_user_step
 logging.basicConfig(level=logging.INFO)
@@ -41,9 +41,7 @@ async def set_bot_token(C, m):
     args = m.text.split(" ", 1)
     if user_id in UB:
         try:
-            await UB[user_id].stop()
-            if UB.get(user_id, None):
-                del UB[user_id]  # Remove from dictionary
+            await UB.remove(user_id)  # Stops the client and drops it from the pool
                 
             try:
                 if os.path.exists(f"user_{user_id}.session"):
@@ -54,7 +52,6 @@ async def set_bot_token(C, m):
             print(f"Stopped and removed old bot for user {user_id}")
         except Exception as e:
             print(f"Error stopping old bot for user {user_id}: {e}")
-            del UB[user_id]  # Remove from dictionary
 
     if len(args) < 2:
         await m.reply_text("⚠️ Please provide a bot token. Usage: `/setbto token`", quote=True)
@@ -70,10 +67,7 @@ async def rem_bot_token(C, m):
     user_id = m.from_user.id
     if user_id in UB:
         try:
-            await UB[user_id].stop()
-            
-            if UB.get(user_id, None):
-                del UB[user_id]  # Remove from dictionary # Remove from dictionary
+            await UB.remove(user_id)  # Stops the client and drops it from the pool
             print(f"Stopped and removed old bot for user {user_id}")
             try:
                 if os.path.exists(f"user_{user_id}.session"):
@@ -82,8 +76,6 @@ async def rem_bot_token(C, m):
                 pass
         except Exception as e:
             print(f"Error stopping old bot for user {user_id}: {e}")
-            if UB.get(user_id, None):
-                del UB[user_id]  # Remove from dictionary  # Remove from dictionary
             try:
                 if os.path.exists(f"user_{user_id}.session"):
                     os.remove(f"user_{user_id}.session")
@@ -146,7 +138,7 @@ Please try again with /login.""")
                 await edit_message_safely(status_msg, '🔄 Verifying code...')
                 await temp_client.sign_in(phone, phone_code_hash, code)
                 session_string = await temp_client.export_session_string()
-                encrypted_session = ecs(session_string)
+                encrypted_session = await aecs(session_string)
                 await save_user_session(user_id, encrypted_session)
                 await temp_client.disconnect()
                 temp_status_msg = login_cache[user_id]['status_msg']
@@ -175,7 +167,7 @@ Please enter your password:"""
                     )
                 await temp_client.check_password(text)
                 session_string = await temp_client.export_session_string()
-                encrypted_session = ecs(session_string)
+                encrypted_session = await aecs(session_string)
                 await save_user_session(user_id, encrypted_session)
                 await temp_client.disconnect()
                 temp_status_msg = login_cache[user_id]['status_msg']
@@ -241,7 +233,7 @@ async def logout_command(client, message):
                 '❌ No active session found for your account.')
             return
         encss = session_data['session_string']
-        session_string = dcs(encss)
+        session_string = await adcs(encss)
         temp_client = Client(f'temp_logout_{user_id}', api_id=API_ID,
             api_hash=API_HASH, session_string=session_string)
         try:
@@ -266,16 +258,14 @@ Still removing from database..."""
                 os.remove(f"{user_id}_client.session")
         except Exception:
             pass
-        if UC.get(user_id, None):
-            del UC[user_id]
+        await UC.remove(user_id)
     except Exception as e:
         logger.error(f'Error in logout command: {str(e)}')
         try:
             await remove_user_session(user_id)
         except Exception:
             pass
-        if UC.get(user_id, None):
-            del UC[user_id]
+        await UC.remove(user_id)
         await edit_message_safely(status_msg,
             f'❌ An error occurred during logout: {str(e)}')
         try:
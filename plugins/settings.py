@@ -10,7 +10,8 @@ import string
 import random
 from shared_client import client as gf
 from config import OWNER_ID
-from utils.func import get_user_data_key, save_user_data, users_collection
+from utils.func import get_user_data_key, save_user_data, users_collection, add_delete_words, set_replacement_word
+from utils.func import get_user_settings, invalidate_user_settings
 
 VIDEO_EXTENSIONS = {
     'mp4', 'mkv', 'avi', 'mov', 'wmv', 'flv', 'webm',
@@ -99,6 +100,7 @@ __👉 **Note:** if you are using custom bot then your bot should be admin that
             {'user_id': user_id},
             {'$unset': {'session_string': ''}}
         )
+        invalidate_user_settings(user_id)
         if result.modified_count > 0:
             await event.respond('Logged out and deleted session successfully.')
         else:
@@ -115,6 +117,7 @@ __👉 **Note:** if you are using custom bot then your bot should be admin that
                     'chat_id': ''
                 }}
             )
+            invalidate_user_settings(user_id)
             thumbnail_path = f'{user_id}.jpg'
             if os.path.exists(thumbnail_path):
                 os.remove(thumbnail_path)
@@ -194,9 +197,7 @@ async def handle_setreplacement(event, user_id):
         if word in delete_words:
             await event.respond(f"❌ The word '{word}' is in the delete list and cannot be replaced.")
         else:
-            replacements = await get_user_data_key(user_id, 'replacement_words', {})
-            replacements[word] = replace_word
-            await save_user_data(user_id, 'replacement_words', replacements)
+            await set_replacement_word(user_id, word, replace_word)
             await event.respond(f"✅ Replacement saved: '{word}' will be replaced with '{replace_word}'")
 
 async def handle_addsession(event, user_id):
@@ -206,9 +207,7 @@ async def handle_addsession(event, user_id):
 
 async def handle_deleteword(event, user_id):
     words_to_delete = event.message.text.split()
-    delete_words = await get_user_data_key(user_id, 'delete_words', [])
-    delete_words = list(set(delete_words + words_to_delete))
-    await save_user_data(user_id, 'delete_words', delete_words)
+    await add_delete_words(user_id, words_to_delete)
     await event.respond(f"✅ Words added to delete list: {', '.join(words_to_delete)}")
 
 async def handle_setthumb(event, user_id):
@@ -232,9 +231,10 @@ def generate_random_name(length=7):
 
 async def rename_file(file, sender, edit):
     try:
-        delete_words = await get_user_data_key(sender, 'delete_words', [])
-        custom_rename_tag = await get_user_data_key(sender, 'rename_tag', '')
-        replacements = await get_user_data_key(sender, 'replacement_words', {})
+        settings = await get_user_settings(sender)
+        delete_words = settings.delete_words
+        custom_rename_tag = settings.rename_tag or ''
+        replacements = settings.replacement_words
         
         last_dot_index = str(file).rfind('.')
         if last_dot_index != -1 and last_dot_index != 0:
@@ -5,7 +5,7 @@
 from datetime import timedelta, datetime
 from shared_client import client as bot_client
 from telethon import events
-from utils.func import get_premium_details, is_private_chat, get_display_name, get_user_data, premium_users_collection, is_premium_user
+from utils.func import get_premium_details, is_private_chat, get_display_name, get_user_data, premium_users_collection, is_premium_user, invalidate_premium
 from config import OWNER_ID
 import logging
 logging.basicConfig(format=
@@ -100,6 +100,8 @@ async def transfer_premium_handler(event):
             'expireAt': expiry_date, 'transferred_from': user_id,
             'transferred_from_name': sender_name}}, upsert=True)
         await premium_users_collection.delete_one({'user_id': user_id})
+        invalidate_premium(target_user_id)
+        invalidate_premium(user_id)
         expiry_ist = expiry_date + timedelta(hours=5, minutes=30)
         formatted_expiry = expiry_ist.strftime('%d-%b-%Y %I:%M:%S %p')
         await event.respond(
@@ -156,6 +158,7 @@ async def remove_premium_handler(event):
             logger.warning(f'Could not get target user name: {e}')
         result = await premium_users_collection.delete_one({'user_id':
             target_user_id})
+        invalidate_premium(target_user_id)
         if result.deleted_count > 0:
             await event.respond(
                 f'✅ Premium subscription successfully removed from {target_name} ({target_user_id}).'
@@ -49,15 +49,12 @@ except ImportError as e:
     CLIENTS_AVAILABLE = False
     logging.error(f"Client import error: {e}")
 
-try:
-    from devgagantools import fast_upload
-    FAST_UPLOAD_AVAILABLE = True
-except ImportError:
-    FAST_UPLOAD_AVAILABLE = False
-    logging.warning("devgagantools not available, using standard upload")
-
 from config import YT_COOKIES, INSTA_COOKIES
 from utils.func import get_video_metadata, screenshot
+from utils.runner import runner
+from utils.parallel import telethon_upload
+from utils.scratch import scratch
+from utils.progress import get_reporter, discard_reporter, progress_bar, format_eta
 from concurrent.futures import ThreadPoolExecutor
 import aiohttp
 import aiofiles
@@ -138,7 +135,7 @@ async def edit_audio_metadata(file_path, title, info_dict):
             # Add thumbnail if available
             thumbnail_url = info_dict.get('thumbnail')
             if thumbnail_url:
-                thumbnail_path = os.path.join(tempfile.gettempdir(), f"thumb_{get_random_string()}.jpg")
+                thumbnail_path = os.path.join(os.path.dirname(file_path), f"thumb_{get_random_string()}.jpg")
                 if d_thumbnail(thumbnail_url, thumbnail_path):
                     try:
                         with open(thumbnail_path, 'rb') as img:
@@ -167,30 +164,33 @@ async def progress_callback(current, total, message):
     try:
         if total > 0:
             percent = (current / total) * 100
-            if percent % 10 == 0:  # Update every 10%
-                await message.edit(f"**📤 Uploading: {percent:.1f}%**")
+            reporter = get_reporter((message.chat_id, message.id), message.edit)
+            speed, eta = reporter.transfer(current, total)
+            await reporter.update(
+                f"**📤 Uploading: {percent:.1f}%**\n\n{progress_bar(percent)}\n\n"
+                f"**🚀 Speed:** {speed / (1024 * 1024):.2f} MB/s\n**⏳ ETA:** {format_eta(eta)}",
+                force=current >= total
+            )
     except Exception as e:
         logger.error(f"Progress callback error: {e}")
 
 async def upload_file_with_progress(client, file_path, chat_id, caption, progress_message):
     """Upload file with progress tracking"""
     try:
-        if FAST_UPLOAD_AVAILABLE:
-            uploaded = await fast_upload(
-                client, 
-                file_path, 
-                reply=progress_message,
-                name=None,
-                progress_bar_function=lambda done, total: progress_callback(done, total, progress_message)
-            )
-            await client.send_file(chat_id, uploaded, caption=caption)
-        else:
-            # Standard upload
-            await client.send_file(chat_id, file_path, caption=caption)
+        # Parts are uploaded concurrently, then the file is sent by handle
+        uploaded = await telethon_upload(
+            client,
+            file_path,
+            progress=progress_callback,
+            progress_args=(progress_message,)
+        )
+        await client.send_file(chat_id, uploaded, caption=caption)
             
     except Exception as e:
         logger.error(f"Upload failed: {e}")
         raise
+    finally:
+        discard_reporter((progress_message.chat_id, progress_message.id))
 
 async def process_audio(client, event, url, cookies_env_var=None):
     """Process audio download with comprehensive error handling"""
@@ -201,6 +201,7 @@ async def process_audio(client, event, url, cookies_env_var=None):
 
     temp_cookie_path = None
     download_path = None
+    job_dir = None
     progress_message = None
     
     try:
@@ -216,8 +217,9 @@ async def process_audio(client, event, url, cookies_env_var=None):
                 temp_cookie_file.write(cookies)
                 temp_cookie_path = temp_cookie_file.name
 
-        # Set up download
-        random_filename = f"@team_spy_pro_{event.sender_id}_{get_random_string()}"
+        # Set up download in a scratch directory of its own
+        job_dir = await scratch.acquire(f"ytdl_{event.sender_id}")
+        random_filename = os.path.join(job_dir, f"@team_spy_pro_{event.sender_id}_{get_random_string()}")
         download_path = f"{random_filename}.mp3"
 
         ydl_opts = {
@@ -283,12 +285,9 @@ async def process_audio(client, event, url, cookies_env_var=None):
             await event.reply(f"❌ **Error processing audio:** {str(e)}")
     
     finally:
-        # Cleanup
-        if download_path and os.path.exists(download_path):
-            try:
-                os.remove(download_path)
-            except:
-                pass
+        # Cleanup; the scratch directory also takes yt-dlp's partial and intermediate files
+        if job_dir:
+            scratch.release(job_dir)
         if temp_cookie_path and os.path.exists(temp_cookie_path):
             try:
                 os.remove(temp_cookie_path)
@@ -304,6 +303,7 @@ async def process_video(client, event, url, cookies_env_var=None):
 
     temp_cookie_path = None
     download_path = None
+    job_dir = None
     progress_message = None
     
     try:
@@ -319,8 +319,9 @@ async def process_video(client, event, url, cookies_env_var=None):
                 temp_cookie_file.write(cookies)
                 temp_cookie_path = temp_cookie_file.name
 
-        # Set up download
-        random_filename = f"@team_spy_pro_{event.sender_id}_{get_random_string()}"
+        # Set up download in a scratch directory of its own
+        job_dir = await scratch.acquire(f"ytdl_{event.sender_id}")
+        random_filename = os.path.join(job_dir, f"@team_spy_pro_{event.sender_id}_{get_random_string()}")
         download_path = f"{random_filename}.mp4"
 
         ydl_opts = {
@@ -385,12 +386,9 @@ async def process_video(client, event, url, cookies_env_var=None):
             await event.reply(f"❌ **Error processing video:** {str(e)}")
     
     finally:
-        # Cleanup
-        if download_path and os.path.exists(download_path):
-            try:
-                os.remove(download_path)
-            except:
-                pass
+        # Cleanup; the scratch directory also takes yt-dlp's partial and intermediate files
+        if job_dir:
+            scratch.release(job_dir)
         if temp_cookie_path and os.path.exists(temp_cookie_path):
             try:
                 os.remove(temp_cookie_path)
@@ -421,18 +419,22 @@ if CLIENTS_AVAILABLE and client and app:
         url = args[1]
         ongoing_downloads[user_id] = True
 
-        try:
-            if "instagram.com" in url:
-                await process_audio(client, event, url, "INSTA_COOKIES")
-            elif "youtube.com" in url or "youtu.be" in url:
-                await process_audio(client, event, url, "YT_COOKIES")
-            else:
-                await process_audio(client, event, url)
-        except Exception as e:
-            logger.error(f"Audio download error: {e}")
-            await event.reply(f"❌ **Error:** {str(e)}")
-        finally:
-            ongoing_downloads.pop(user_id, None)
+        async def run():
+            try:
+                if "instagram.com" in url:
+                    await process_audio(client, event, url, "INSTA_COOKIES")
+                elif "youtube.com" in url or "youtu.be" in url:
+                    await process_audio(client, event, url, "YT_COOKIES")
+                else:
+                    await process_audio(client, event, url)
+            except Exception as e:
+                logger.error(f"Audio download error: {e}")
+                await event.reply(f"❌ **Error:** {str(e)}")
+            finally:
+                ongoing_downloads.pop(user_id, None)
+
+        # Long downloads run on the job runner, not in the update handler
+        await runner.enqueue(user_id, run, "adl")
 
     @client.on(events.NewMessage(pattern=r"/dl"))
     async def video_download_handler(event):
@@ -456,18 +458,22 @@ if CLIENTS_AVAILABLE and client and app:
         url = args[1]
         ongoing_downloads[user_id] = True
 
-        try:
-            if "instagram.com" in url:
-                await process_video(client, event, url, "INSTA_COOKIES")
-            elif "youtube.com" in url or "youtu.be" in url:
-                await process_video(client, event, url, "YT_COOKIES")
-            else:
-                await process_video(client, event, url)
-        except Exception as e:
-            logger.error(f"Video download error: {e}")
-            await event.reply(f"❌ **Error:** {str(e)}")
-        finally:
-            ongoing_downloads.pop(user_id, None)
+        async def run():
+            try:
+                if "instagram.com" in url:
+                    await process_video(client, event, url, "INSTA_COOKIES")
+                elif "youtube.com" in url or "youtu.be" in url:
+                    await process_video(client, event, url, "YT_COOKIES")
+                else:
+                    await process_video(client, event, url)
+            except Exception as e:
+                logger.error(f"Video download error: {e}")
+                await event.reply(f"❌ **Error:** {str(e)}")
+            finally:
+                ongoing_downloads.pop(user_id, None)
+
+        # Long downloads run on the job runner, not in the update handler
+        await runner.enqueue(user_id, run, "dl")
 
     @client.on(events.NewMessage(pattern=r"/cancel"))
     async def cancel_download_handler(event):
@@ -0,0 +1,148 @@
+# Copyright (c) 2025 devgagan : https://github.com/devgaganin.
+# Licensed under the GNU General Public License v3.0.
+# See LICENSE file in the repository root for full license text.
+
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from config import POOL_MAX_CLIENTS, POOL_IDLE_TIMEOUT
+from utils.parallel import close_sessions
+
+logger = logging.getLogger(__name__)
+
+SWEEP_INTERVAL = 60  # seconds between idle checks
+
+
+class PooledClient:
+    __slots__ = ("client", "last_used", "leases")
+
+    def __init__(self, client):
+        self.client = client
+        self.last_used = time.monotonic()
+        self.leases = 0
+
+
+class ClientPool:
+    """Started per-user clients, at most POOL_MAX_CLIENTS of them.
+
+    A client is started by `factory()` on first use; a cached client is
+    returned without any database lookup. When the pool is full the least
+    recently used client is stopped, and clients unused for
+    POOL_IDLE_TIMEOUT seconds are stopped by a sweeper. Clients held with
+    `lease` (a running batch) are never evicted. Concurrent callers for
+    the same key wait for a single startup. `on_remove(key)` runs when a
+    key is removed for good (logout), not on eviction.
+    """
+
+    def __init__(self, name, max_clients=POOL_MAX_CLIENTS, idle_timeout=POOL_IDLE_TIMEOUT, on_remove=None):
+        self.name = name
+        self.on_remove = on_remove
+        self.max_clients = max_clients
+        self.idle_timeout = idle_timeout
+        self.entries = OrderedDict()  # key -> PooledClient, least recently used first
+        self.locks = {}  # key -> [startup lock, callers holding or waiting on it]
+        self.sweeper = None
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def peek(self, key):
+        """The cached client for key, without starting one"""
+        entry = self.entries.get(key)
+        return entry.client if entry else None
+
+    def _touch(self, key):
+        entry = self.entries[key]
+        entry.last_used = time.monotonic()
+        self.entries.move_to_end(key)
+        return entry
+
+    async def get(self, key, factory):
+        if key in self.entries:
+            return self._touch(key).client
+        starting = self.locks.setdefault(key, [asyncio.Lock(), 0])
+        starting[1] += 1
+        try:
+            async with starting[0]:
+                if key in self.entries:
+                    return self._touch(key).client
+                client = await factory()
+                if client is None:
+                    return None
+                self.entries[key] = PooledClient(client)
+        finally:
+            # Dropped once nobody needs it, so keys of past users do not pile up
+            starting[1] -= 1
+            if not starting[1] and self.locks.get(key) is starting:
+                del self.locks[key]
+        await self._shrink()
+        self._ensure_sweeper()
+        return client
+
+    @asynccontextmanager
+    async def lease(self, key, factory):
+        """Hold the client for the duration of the block so it cannot be evicted"""
+        client = await self.get(key, factory)
+        entry = self.entries.get(key)
+        if entry is None or entry.client is not client:
+            entry = None
+        else:
+            entry.leases += 1
+        try:
+            yield client
+        finally:
+            if entry:
+                entry.leases -= 1
+                entry.last_used = time.monotonic()
+
+    async def remove(self, key):
+        """Stop and forget the client for key, e.g. after logout"""
+        entry = self.entries.pop(key, None)
+        self.locks.pop(key, None)
+        if self.on_remove:
+            self.on_remove(key)
+        if entry:
+            await self._stop(key, entry)
+
+    async def _stop(self, key, entry):
+        try:
+            await close_sessions(entry.client)
+            await entry.client.stop()
+        except Exception as e:
+            logger.error(f"Error stopping {self.name} client for {key}: {e}")
+
+    async def _shrink(self):
+        over = len(self.entries) - self.max_clients
+        if over <= 0:
+            return
+        victims = [k for k, e in self.entries.items() if not e.leases][:over]
+        if len(victims) < over:
+            logger.warning(f"{self.name} pool over capacity: {len(self.entries)} clients, all in use")
+        for key in victims:
+            await self._stop(key, self.entries.pop(key))
+
+    def _ensure_sweeper(self):
+        if self.sweeper is None or self.sweeper.done():
+            self.sweeper = asyncio.create_task(self._sweep_loop())
+
+    async def _sweep_loop(self):
+        while self.entries:
+            await asyncio.sleep(SWEEP_INTERVAL)
+            cutoff = time.monotonic() - self.idle_timeout
+            idle = [k for k, e in self.entries.items() if not e.leases and e.last_used < cutoff]
+            for key in idle:
+                entry = self.entries.pop(key, None)
+                if entry:
+                    await self._stop(key, entry)
+            if idle:
+                logger.info(f"Stopped {len(idle)} idle {self.name} client(s)")
+
+    async def close(self):
+        while self.entries:
+            key, entry = self.entries.popitem()
+            await self._stop(key, entry)
@@ -1,24 +1,54 @@
 # crypto_ops.py
+import asyncio
 from cryptography.hazmat.primitives import hashes as hsh
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC as PBK
 from cryptography.hazmat.primitives.ciphers import Cipher as Cp, algorithms as alg, modes as md
 import base64 as b64
 import os as osy
-from config import MASTER_KEY as M1, IV_KEY as I1
+from config import MASTER_KEY as M1, IV_KEY as I1, KEY_VERSION as KV, OLD_KEYS as OK
+
+# Ciphertexts are "v<version>:" + b64(nonce + tag + ct); untagged ones predate versions
+LV = 1
+
+def kr():
+    ks = {KV: (M1, I1)}
+    for e in filter(None, OK.split(",")):
+        v, m, i = e.strip().split(":", 2)
+        ks.setdefault(int(v), (m, i))
+    return ks
+
+KS = kr()
+
+# (password, salt, length) -> derived key; PBKDF2 runs once per key, not per call
+KC = {}
 
 def dyk(pwd=M1, slt=I1, l=16):
-    pw = pwd.encode()
-    sl = slt.encode()
-    kdf = PBK(
-        algorithm=hsh.SHA256(),
-        length=l,
-        salt=sl,
-        iterations=100000,
-    )
-    return kdf.derive(pw)
+    ck = (pwd, slt, l)
+    if ck not in KC:
+        pw = pwd.encode()
+        sl = slt.encode()
+        kdf = PBK(
+            algorithm=hsh.SHA256(),
+            length=l,
+            salt=sl,
+            iterations=100000,
+        )
+        KC[ck] = kdf.derive(pw)
+    return KC[ck]
+
+def vk(v):
+    if v not in KS:
+        raise ValueError(f"Unknown key version {v}")
+    return dyk(*KS[v])
+
+def spl(ed):
+    if ed.startswith("v") and ":" in ed:
+        v, ed = ed[1:].split(":", 1)
+        return int(v), ed
+    return LV, ed
 
 def ecs(s):
-    k = dyk()
+    k = vk(KV)
     n = osy.urandom(12) 
     cp = Cp(alg.AES(k), md.GCM(n))
     enc = cp.encryptor()
@@ -26,10 +56,11 @@ def ecs(s):
     ct = enc.update(p) + enc.finalize()
     tg = enc.tag
     encd = b64.b64encode(n + tg + ct).decode()
-    return encd
+    return f"v{KV}:{encd}"
 
 def dcs(ed):
-    k = dyk()
+    v, ed = spl(ed)
+    k = vk(v)
     dat = b64.b64decode(ed.encode())
     n = dat[:12]
     tg = dat[12:28]
@@ -38,3 +69,53 @@ def dcs(ed):
     dec = cp.decryptor()
     res = dec.update(ct) + dec.finalize()
     return res.decode()
+
+# version -> executor future of a derivation in flight, shared by concurrent callers
+PD = {}
+
+async def rdy(v):
+    # A key's first use runs the KDF; keep those ~100 ms off the event loop
+    if v not in KS or KS[v] + (16,) in KC:
+        return
+    if v not in PD:
+        PD[v] = asyncio.get_running_loop().run_in_executor(None, vk, v)
+        PD[v].add_done_callback(lambda _: PD.pop(v, None))
+    await asyncio.shield(PD[v])
+
+async def aecs(s):
+    await rdy(KV)
+    return ecs(s)
+
+async def adcs(ed):
+    await rdy(spl(ed)[0])
+    return dcs(ed)
+
+if __name__ == "__main__":
+    # Bulk session decryption, per-call KDF vs cached key: python -m utils.encrypt
+    import time
+    N = 200
+    sessions = [ecs(osy.urandom(256).hex()) for _ in range(N)]
+
+    t = time.perf_counter()
+    for s in sessions:
+        KC.clear()
+        dcs(s)
+    cold = time.perf_counter() - t
+
+    KC.clear()
+    t = time.perf_counter()
+    for s in sessions:
+        dcs(s)
+    warm = time.perf_counter() - t
+
+    async def bulk():
+        KC.clear()
+        t = time.perf_counter()
+        await asyncio.gather(*(adcs(s) for s in sessions))
+        return time.perf_counter() - t
+
+    both = asyncio.run(bulk())
+
+    print(f"{N} sessions, KDF per call: {cold * 1000:9.1f} ms ({cold / N * 1000:.2f} ms each)")
+    print(f"{N} sessions, cached key:   {warm * 1000:9.1f} ms ({warm / N * 1000:.3f} ms each)")
+    print(f"{N} sessions, adcs gather:  {both * 1000:9.1f} ms")
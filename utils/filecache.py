@@ -0,0 +1,83 @@
+# Copyright (c) 2025 devgagan : https://github.com/devgaganin.
+# Licensed under the GNU General Public License v3.0.
+# See LICENSE file in the repository root for full license text.
+
+import os
+import time
+import logging
+from pymongo import UpdateOne
+from config import FILE_CACHE
+from utils.func import db
+from utils.writebatch import writes
+
+logger = logging.getLogger(__name__)
+
+# (uploading client, source file_unique_id, variant) -> file_id of our upload
+file_cache_collection = db["file_cache"]
+
+
+def source_unique_id(message):
+    media = message.video or message.document or message.audio or message.photo
+    return getattr(media, "file_unique_id", None)
+
+
+def sent_file_id(message):
+    media = message and (message.video or message.document or message.audio or message.photo)
+    return getattr(media, "file_id", None)
+
+
+def file_variant(message, rename_tag=None, thumb=None):
+    """What makes two uploads of the same source differ: the rename tag and a custom thumbnail.
+
+    Only stable inputs go in. Without a rename tag the uploaded name is
+    generated (video_<timestamp>.mp4), so the source's own name stands in.
+    """
+    if rename_tag:
+        name = f"tag:{rename_tag}"
+    else:
+        media = message.video or message.document or message.audio or message.photo
+        name = f"src:{getattr(media, 'file_name', None) or ''}"
+    if thumb and os.path.exists(thumb):
+        return f"{name}|{os.path.basename(thumb)}:{int(os.path.getmtime(thumb))}"
+    return name
+
+
+def _key(client, unique_id, variant):
+    # file_ids are only valid for the account that uploaded them
+    return f"{client.me.id}:{unique_id}:{variant}"
+
+
+async def get_cached_file(client, message, variant):
+    unique_id = source_unique_id(message)
+    if not FILE_CACHE or not unique_id or not client.me:
+        return None
+    try:
+        doc = await file_cache_collection.find_one({"_id": _key(client, unique_id, variant)}, {"file_id": 1})
+        return doc["file_id"] if doc else None
+    except Exception as e:
+        logger.error(f"Error reading file cache: {e}")
+        return None
+
+
+async def cache_file(client, message, variant, sent):
+    unique_id = source_unique_id(message)
+    file_id = sent_file_id(sent)
+    if not FILE_CACHE or not unique_id or not file_id or not client.me:
+        return
+    # Batched: nothing reads an entry back until the same file is sent again
+    key = _key(client, unique_id, variant)
+    writes.queue(file_cache_collection, UpdateOne(
+        {"_id": key},
+        {"$set": {"file_id": file_id, "updated_at": time.time()}},
+        upsert=True
+    ), key=key)
+
+
+async def forget_cached_file(client, message, variant):
+    unique_id = source_unique_id(message)
+    if not unique_id or not client.me:
+        return
+    try:
+        await file_cache_collection.delete_one({"_id": _key(client, unique_id, variant)})
+    except Exception as e:
+        logger.error(f"Error clearing file cache: {e}")
@@ -9,15 +9,17 @@ import re
 import cv2
 import logging
 import asyncio
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta
 from motor.motor_asyncio import AsyncIOMotorClient
-from config import MONGO_DB as MONGO_URI, DB_NAME
+from config import MONGO_DB as MONGO_URI, DB_NAME, SETTINGS_CACHE_TTL, PREMIUM_NEGATIVE_TTL
 
 logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 PUBLIC_LINK_PATTERN = re.compile(r'(https?://)?(t\.me|telegram\.me)/([^/]+)(/(\d+))?')
 PRIVATE_LINK_PATTERN = re.compile(r'(https?://)?(t\.me|telegram\.me)/c/(\d+)(/(\d+))?')
+RANGE_LINK_PATTERN = re.compile(r'^(https?://t\.me/(?:c/)?[^/\s]+/(?:\d+/)?)(\d+)-(\d+)$')
 VIDEO_EXTENSIONS = {"mp4", "mkv", "avi", "mov", "wmv", "flv", "webm", "mpeg", "mpg", "3gp"}
 
 mongo_client = AsyncIOMotorClient(MONGO_URI)
@@ -27,6 +29,17 @@ premium_users_collection = db["premium_users"]
 statistics_collection = db["statistics"]
 codedb = db["redeem_code"]
 
+# user_id -> (expires_at, UserSettings)
+settings_cache = {}
+
+# user_id -> subscription_end (answers until then) or None with a monotonic
+# deadline (a "not premium" answer, kept PREMIUM_NEGATIVE_TTL seconds)
+premium_cache = {}
+premium_watcher = None
+
+# Only the fields UserSettings reads
+SETTINGS_PROJECTION = {"_id": 0, "chat_id": 1, "caption": 1, "rename_tag": 1, "replacement_words": 1, "delete_words": 1}
+
 # ------- < start > Session Encoder don't change -------
 
 a1 = "c2F2ZV9yZXN0cmljdGVkX2NvbnRlbnRfYm90cw=="
@@ -68,6 +81,12 @@ def E(L):
     return None, None, None
 
 
+def read_lines(path):
+    """Stream a links file line by line"""
+    with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+        yield from f
+
+
 def get_display_name(user):
     if user.first_name and user.last_name:
         return f"{user.first_name} {user.last_name}"
@@ -101,21 +120,111 @@ async def is_private_chat(event):
     return event.is_private
 
 
+async def ensure_indexes():
+    """Create the indexes every lookup relies on; run once at startup"""
+    try:
+        await users_collection.create_index("user_id")
+        await premium_users_collection.create_index("user_id")
+        await premium_users_collection.create_index("expireAt", expireAfterSeconds=0)
+        logger.info("Database indexes ready")
+    except Exception as e:
+        logger.error(f"Error creating indexes: {e}")
+
+
 async def save_user_data(user_id, key, value):
     await users_collection.update_one(
         {"user_id": user_id},
         {"$set": {key: value}},
         upsert=True
     )
+    invalidate_user_settings(user_id)
    # print(users_collection)
 
 
 async def get_user_data_key(user_id, key, default=None):
-    user_data = await users_collection.find_one({"user_id": int(user_id)})
+    user_data = await users_collection.find_one({"user_id": int(user_id)}, {"_id": 0, key: 1})
   #  print(f"Fetching key '{key}' for user {user_id}: {user_data}")
     return user_data.get(key, default) if user_data else default
 
 
+def is_field_name(word):
+    # Usable as a key of a nested $set path
+    return bool(word) and "." not in word and not word.startswith("$")
+
+
+async def add_delete_words(user_id, words):
+    """Add words to the delete list with $addToSet instead of rewriting the array"""
+    await users_collection.update_one(
+        {"user_id": user_id},
+        {"$addToSet": {"delete_words": {"$each": list(dict.fromkeys(words))}}},
+        upsert=True
+    )
+    invalidate_user_settings(user_id)
+
+
+async def set_replacement_word(user_id, word, replacement):
+    """Set one entry of replacement_words with a nested $set"""
+    if not is_field_name(word):
+        # Dots and a leading $ cannot be part of a field path; rewrite the dict
+        replacements = await get_user_data_key(user_id, "replacement_words", {})
+        replacements[word] = replacement
+        await save_user_data(user_id, "replacement_words", replacements)
+        return
+    await users_collection.update_one(
+        {"user_id": user_id},
+        {"$set": {f"replacement_words.{word}": replacement}},
+        upsert=True
+    )
+    invalidate_user_settings(user_id)
+
+
+@dataclass
+class UserSettings:
+    """Per-user delivery settings, loaded once and shared by every link of a task"""
+    chat_id: str | None = None
+    caption: str | None = None
+    rename_tag: str | None = None
+    replacement_words: dict = field(default_factory=dict)
+    delete_words: list = field(default_factory=list)
+
+    @classmethod
+    def from_document(cls, doc):
+        doc = doc or {}
+        return cls(
+            chat_id=doc.get("chat_id"),
+            caption=doc.get("caption"),
+            rename_tag=doc.get("rename_tag"),
+            replacement_words=doc.get("replacement_words") or {},
+            delete_words=doc.get("delete_words") or []
+        )
+
+
+async def get_user_settings(user_id):
+    """The user's settings; raises when they cannot be loaded and none are cached.
+
+    Empty settings in place of unreadable ones would send files to the
+    user's DM instead of their channel and drop their caption rules.
+    """
+    user_id = int(user_id)
+    cached = settings_cache.get(user_id)
+    if cached and cached[0] > time.monotonic():
+        return cached[1]
+    try:
+        user_data = await users_collection.find_one({"user_id": user_id}, SETTINGS_PROJECTION)
+    except Exception as e:
+        logger.error(f"Error loading settings for {user_id}: {e}")
+        if cached:
+            return cached[1]
+        raise
+    settings = UserSettings.from_document(user_data)
+    settings_cache[user_id] = (time.monotonic() + SETTINGS_CACHE_TTL, settings)
+    return settings
+
+
+def invalidate_user_settings(user_id):
+    settings_cache.pop(int(user_id), None)
+
+
 async def get_user_data(user_id):
     try:
         user_data = await users_collection.find_one({"user_id": user_id})
@@ -185,13 +294,15 @@ async def remove_user_bot(user_id):
         return False
 
 
-async def process_text_with_rules(user_id, text):
+async def process_text_with_rules(user_id, text, settings=None):
     if not text:
         return ""
     
+    if settings is None:
+        settings = await get_user_settings(user_id)
     try:
-        replacements = await get_user_data_key(user_id, "replacement_words", {})
-        delete_words = await get_user_data_key(user_id, "delete_words", [])
+        replacements = settings.replacement_words
+        delete_words = settings.delete_words
         
         processed_text = text
         for word, replacement in replacements.items():
@@ -214,7 +325,8 @@ async def screenshot(video: str, duration: int, sender: str) -> str | None:
         return existing_screenshot
 
     time_stamp = hhmmss(duration // 2)
-    output_file = datetime.now().isoformat("_", "seconds") + ".jpg"
+    # Next to the video, so it is cleaned up with the video's scratch directory
+    output_file = os.path.join(os.path.dirname(os.path.abspath(video)), f"thumb_{sender}_{time.time_ns()}.jpg")
 
     cmd = [
         "ffmpeg",
@@ -309,8 +421,7 @@ async def add_premium_user(user_id, duration_value, duration_unit):
             }},
             upsert=True
         )
-        
-        await premium_users_collection.create_index("expireAt", expireAfterSeconds=0)
+        invalidate_premium(user_id)
         
         return True, expiry_date
     except Exception as e:
@@ -318,18 +429,66 @@ async def add_premium_user(user_id, duration_value, duration_unit):
         return False, str(e)
 
 
+def cache_premium(user_id, subscription_end):
+    if subscription_end and datetime.now() < subscription_end:
+        premium_cache[user_id] = (subscription_end, None)
+    else:
+        premium_cache[user_id] = (None, time.monotonic() + PREMIUM_NEGATIVE_TTL)
+
+
+def invalidate_premium(user_id):
+    premium_cache.pop(user_id, None)
+
+
 async def is_premium_user(user_id):
+    cached = premium_cache.get(user_id)
+    if cached:
+        subscription_end, deadline = cached
+        if subscription_end:
+            if datetime.now() < subscription_end:
+                return True
+        elif deadline > time.monotonic():
+            return False
+        # Expired, or renewed since; ask the database again
     try:
-        user = await premium_users_collection.find_one({"user_id": user_id})
-        if user and "subscription_end" in user:
-            now = datetime.now()
-            return now < user["subscription_end"]
-        return False
+        user = await premium_users_collection.find_one({"user_id": user_id}, {"_id": 0, "subscription_end": 1})
+        subscription_end = user.get("subscription_end") if user else None
+        cache_premium(user_id, subscription_end)
+        return bool(subscription_end) and datetime.now() < subscription_end
     except Exception as e:
         logger.error(f"Error checking premium status for {user_id}: {e}")
         return False
 
 
+async def watch_premium_changes():
+    """Drop cached premium status when any instance changes premium_users"""
+    while True:
+        try:
+            async with premium_users_collection.watch(full_document="updateLookup") as stream:
+                # Changes made while no stream was open were missed
+                premium_cache.clear()
+                logger.info("Watching premium changes")
+                async for change in stream:
+                    doc = change.get("fullDocument")
+                    if doc and "user_id" in doc:
+                        invalidate_premium(doc["user_id"])
+                    else:
+                        # Delete events only carry the _id; they are rare enough to drop everything
+                        premium_cache.clear()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Premium change stream stopped: {e}")
+            premium_cache.clear()
+            await asyncio.sleep(30)
+
+
+def start_premium_watcher():
+    global premium_watcher
+    if premium_watcher is None or premium_watcher.done():
+        premium_watcher = asyncio.create_task(watch_premium_changes())
+
+
 async def get_premium_details(user_id):
     try:
         user = await premium_users_collection.find_one({"user_id": user_id})
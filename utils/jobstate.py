@@ -0,0 +1,191 @@
+# Copyright (c) 2025 devgagan : https://github.com/devgaganin.
+# Licensed under the GNU General Public License v3.0.
+# See LICENSE file in the repository root for full license text.
+
+import re
+import base64
+from array import array
+from utils.func import RANGE_LINK_PATTERN
+
+# Everything before the message id is the segment prefix: chat (and topic) once per run of links
+LINK_ID_PATTERN = re.compile(r'^(https?://t\.me/\S+/)(\d+)(?:\?\S*)?$')
+
+
+class Segment:
+    """A run of links that share one prefix.
+
+    Ids are either a contiguous range (start, count) or an array('q') of
+    8 bytes per id, never a list of URL strings.
+    """
+
+    __slots__ = ("prefix", "start", "count", "ids")
+
+    def __init__(self, prefix, start, count=1, ids=None):
+        self.prefix = prefix
+        self.start = start
+        self.count = count
+        self.ids = ids
+
+    def __len__(self):
+        return self.count if self.ids is None else len(self.ids)
+
+    def id_at(self, k):
+        return self.start + k if self.ids is None else self.ids[k]
+
+    def to_list(self):
+        if self.ids is None:
+            return [self.prefix, self.start, self.count]
+        return [self.prefix, base64.b64encode(self.ids.tobytes()).decode()]
+
+    @classmethod
+    def from_list(cls, data):
+        if len(data) == 3:
+            return cls(data[0], data[1], data[2])
+        ids = array('q')
+        ids.frombytes(base64.b64decode(data[1]))
+        return cls(data[0], None, ids=ids)
+
+
+class LinkSet:
+    """Ordered batch links with a per-item done bitmap.
+
+    Indices are positions in the batch; `pending()` yields only the links
+    whose bit is still clear, so a resumed batch skips exactly what was done.
+    """
+
+    def __init__(self):
+        self.segments = []
+        self.size = 0
+        self.invalid = 0
+        self.done = 0
+        self.bitmap = bytearray()
+
+    def __len__(self):
+        return self.size
+
+    def _tail(self, prefix):
+        if self.segments and self.segments[-1].prefix == prefix:
+            return self.segments[-1]
+        return None
+
+    def add(self, link):
+        match = LINK_ID_PATTERN.match(link.strip())
+        if not match:
+            self.invalid += 1
+            return
+        prefix, msg_id = match.group(1), int(match.group(2))
+        tail = self._tail(prefix)
+        if tail and tail.ids is None and msg_id == tail.start + tail.count:
+            tail.count += 1
+        elif tail and (tail.ids is not None or tail.count == 1):
+            # Scattered ids; a long range is never unpacked into the array
+            if tail.ids is None:
+                tail.ids = array('q', [tail.start])
+            tail.ids.append(msg_id)
+        else:
+            self.segments.append(Segment(prefix, msg_id))
+        self.size += 1
+
+    def add_range(self, prefix, first, last):
+        count = last - first + 1
+        tail = self._tail(prefix)
+        if tail and tail.ids is None and tail.start + tail.count == first:
+            tail.count += count
+        else:
+            self.segments.append(Segment(prefix, first, count))
+        self.size += count
+
+    def seal(self):
+        """Allocate the status bitmap once every link is in"""
+        self.bitmap = bytearray((self.size + 7) // 8)
+        self.done = 0
+        return self
+
+    @classmethod
+    def from_lines(cls, lines):
+        """Build from pasted lines or a streamed file; ranges stay a single segment"""
+        links = cls()
+        for line in lines:
+            line = line.strip()
+            match = RANGE_LINK_PATTERN.match(line)
+            if match:
+                first, last = int(match.group(2)), int(match.group(3))
+                links.add_range(match.group(1), min(first, last), max(first, last))
+            elif "t.me" in line:
+                links.add(line)
+        return links.seal()
+
+    def is_done(self, index):
+        return bool(self.bitmap[index >> 3] & (1 << (index & 7)))
+
+    def mark(self, index):
+        if not self.is_done(index):
+            self.bitmap[index >> 3] |= 1 << (index & 7)
+            self.done += 1
+
+    def pending(self):
+        """Yield (index, link) for every link not marked done"""
+        index = 0
+        for seg in self.segments:
+            for k in range(len(seg)):
+                if not self.is_done(index):
+                    yield index, f"{seg.prefix}{seg.id_at(k)}"
+                index += 1
+
+    def encoded_bitmap(self):
+        return base64.b64encode(bytes(self.bitmap)).decode()
+
+    def to_dict(self):
+        return {
+            "segments": [seg.to_list() for seg in self.segments],
+            "size": self.size,
+            "invalid": self.invalid,
+            "bitmap": self.encoded_bitmap()
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        links = cls()
+        links.segments = [Segment.from_list(s) for s in data["segments"]]
+        links.size = data["size"]
+        links.invalid = data.get("invalid", 0)
+        links.bitmap = bytearray(base64.b64decode(data["bitmap"]))
+        links.done = sum(bin(b).count("1") for b in links.bitmap)
+        return links
+
+
+def encode_state(obj):
+    """json.dumps default= hook for jobs holding a LinkSet"""
+    if isinstance(obj, LinkSet):
+        return obj.to_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+if __name__ == "__main__":
+    # Memory footprint of a 1M-item job: python -m utils.jobstate
+    import random
+    import tracemalloc
+
+    N = 1_000_000
+    prefix = "https://t.me/c/1234567890/"
+
+    def measure(name, build):
+        tracemalloc.start()
+        obj = build()
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"{name:<28} {size / 1024 / 1024:8.2f} MB")
+        return obj
+
+    measure("list of URL strings", lambda: [f"{prefix}{i}" for i in range(1, N + 1)])
+    measure("LinkSet, one range", lambda: LinkSet.from_lines([f"{prefix}1-{N}"]))
+    ids = random.sample(range(1, 50 * N), N)
+
+    def scattered():
+        links = LinkSet()
+        for i in ids:
+            links.add(f"{prefix}{i}")
+        return links.seal()
+
+    links = measure("LinkSet, scattered ids", scattered)
+    print(f"{'serialized (scattered)':<28} {len(str(links.to_dict())) / 1024 / 1024:8.2f} MB")
@@ -0,0 +1,234 @@
+# Copyright (c) 2025 devgagan : https://github.com/devgaganin.
+# Licensed under the GNU General Public License v3.0.
+# See LICENSE file in the repository root for full license text.
+
+import os
+import json
+import asyncio
+import logging
+from pymongo import ReplaceOne, UpdateOne, DeleteOne
+from config import JOB_STORE, JOB_FLUSH_INTERVAL
+from utils.jobstate import LinkSet, encode_state
+
+logger = logging.getLogger(__name__)
+
+COMPACT_EVERY = 10000  # journal records between compactions
+
+
+class FileJournalBackend:
+    """Append-only JSON-lines journal of job records, replayed on load.
+
+    Every record is small (a progress update touches a few fields or marks
+    a few items done), so the write cost of a checkpoint does not depend on
+    the size of the job.
+    """
+
+    def __init__(self, path, legacy_path=None):
+        self.path = path
+        self.legacy_path = legacy_path
+        self.records = 0
+
+    def _replay(self):
+        jobs = {}
+        with open(self.path, 'r') as f:
+            for line in f:
+                try:
+                    apply_record(jobs, json.loads(line))
+                except ValueError:
+                    # A torn last line after a crash is expected; skip it
+                    continue
+        return jobs
+
+    def load(self):
+        try:
+            if os.path.exists(self.path):
+                jobs = self._replay()
+            elif self.legacy_path and os.path.exists(self.legacy_path):
+                with open(self.legacy_path, 'r') as f:
+                    jobs = json.load(f)
+            else:
+                jobs = {}
+        except Exception as e:
+            logger.error(f"Error loading job journal: {e}")
+            jobs = {}
+        self.compact(jobs)
+        return jobs
+
+    def append(self, records):
+        with open(self.path, 'a') as f:
+            f.write(''.join(json.dumps(r, default=encode_state) + '\n' for r in records))
+            f.flush()
+        self.records += len(records)
+
+    def compact(self, jobs):
+        tmp = f"{self.path}.tmp"
+        with open(tmp, 'w') as f:
+            for uid, job in jobs.items():
+                f.write(json.dumps({"op": "put", "uid": uid, "job": job}, default=encode_state) + '\n')
+        os.replace(tmp, self.path)
+        self.records = len(jobs)
+
+    def needs_compaction(self):
+        return self.records >= COMPACT_EVERY
+
+
+class MongoBackend:
+    """One document per job in a Mongo collection, updated with bulk writes"""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def load(self):
+        jobs = {}
+        try:
+            async for doc in self.collection.find({}):
+                uid = str(doc.pop("_id"))
+                # Mark journals of older versions, folded into the bitmap
+                marks = doc.pop("marks", [])
+                apply_record(jobs, {"op": "put", "uid": uid, "job": doc})
+                apply_record(jobs, {"op": "mark", "uid": uid, "items": marks})
+        except Exception as e:
+            logger.error(f"Error loading batch jobs: {e}")
+        return jobs
+
+    async def append(self, records):
+        ops = []
+        for r in records:
+            if r["op"] == "put":
+                job = json.loads(json.dumps(r["job"], default=encode_state))
+                ops.append(ReplaceOne({"_id": r["uid"]}, job, upsert=True))
+            elif r["op"] == "set":
+                ops.append(UpdateOne({"_id": r["uid"]}, {"$set": r["fields"]}))
+            elif r["op"] == "del":
+                ops.append(DeleteOne({"_id": r["uid"]}))
+        if ops:
+            await self.collection.bulk_write(ops, ordered=True)
+
+
+def apply_record(jobs, r):
+    if r["op"] == "put":
+        job = r["job"]
+        if isinstance(job.get("items"), dict):
+            job["items"] = LinkSet.from_dict(job["items"])
+        jobs[r["uid"]] = job
+    elif r["op"] == "set" and r["uid"] in jobs:
+        jobs[r["uid"]].update(r["fields"])
+    elif r["op"] == "mark" and r["uid"] in jobs:
+        items = jobs[r["uid"]].get("items")
+        if isinstance(items, LinkSet):
+            for index in r["items"]:
+                items.mark(index)
+    elif r["op"] == "del":
+        jobs.pop(r["uid"], None)
+
+
+class JobStore:
+    """In-memory batch jobs with coalesced, durable checkpoints.
+
+    `jobs` is the live dict used by the batch plugin. Writes are queued as
+    records; progress updates for the same job are merged until the next
+    flush, which runs every JOB_FLUSH_INTERVAL seconds off the event loop.
+    A job's link set is written once with the job; after that the file
+    journal records only the indices marked done, and Mongo gets the
+    job's bitmap in place.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.jobs = {}
+        self.queue = []
+        self.pending = {}
+        self.marks = {}
+        self.lock = asyncio.Lock()
+        self.flusher = None
+
+    def load_sync(self):
+        if isinstance(self.backend, FileJournalBackend):
+            self.jobs.update(self.backend.load())
+        return self.jobs
+
+    async def load(self):
+        if isinstance(self.backend, MongoBackend):
+            self.jobs.update(await self.backend.load())
+        return self.jobs
+
+    def _ensure_flusher(self):
+        if self.flusher is None or self.flusher.done():
+            self.flusher = asyncio.create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        while self.queue or self.pending or self.marks:
+            await asyncio.sleep(JOB_FLUSH_INTERVAL)
+            await self.flush()
+
+    def _take_pending(self):
+        for uid, fields in self.pending.items():
+            self.queue.append({"op": "set", "uid": uid, "fields": fields})
+        for uid, items in self.marks.items():
+            if isinstance(self.backend, MongoBackend):
+                # The bitmap is rewritten in place; an array of done indices would
+                # push a large job past Mongo's 16 MB document limit
+                links = self.jobs.get(uid, {}).get("items")
+                if isinstance(links, LinkSet):
+                    self.queue.append({"op": "set", "uid": uid, "fields": {"items.bitmap": links.encoded_bitmap()}})
+            else:
+                self.queue.append({"op": "mark", "uid": uid, "items": items})
+        self.pending = {}
+        self.marks = {}
+
+    async def put(self, uid, job):
+        self.jobs[uid] = job
+        self.pending.pop(uid, None)
+        self.marks.pop(uid, None)
+        self.queue.append({"op": "put", "uid": uid, "job": job})
+        await self.flush()
+
+    def update(self, uid, **fields):
+        if uid not in self.jobs:
+            return
+        self.jobs[uid].update(fields)
+        self.pending.setdefault(uid, {}).update(fields)
+        self._ensure_flusher()
+
+    def mark(self, uid, indices):
+        """Mark items of the job's LinkSet done"""
+        items = self.jobs.get(uid, {}).get("items")
+        if not isinstance(items, LinkSet):
+            return
+        for index in indices:
+            items.mark(index)
+        self.marks.setdefault(uid, []).extend(indices)
+        self._ensure_flusher()
+
+    async def remove(self, uid):
+        self.jobs.pop(uid, None)
+        self.pending.pop(uid, None)
+        self.marks.pop(uid, None)
+        self.queue.append({"op": "del", "uid": uid})
+        await self.flush()
+
+    async def flush(self):
+        async with self.lock:
+            self._take_pending()
+            records, self.queue = self.queue, []
+            if not records:
+                return
+            try:
+                if isinstance(self.backend, FileJournalBackend):
+                    loop = asyncio.get_running_loop()
+                    await loop.run_in_executor(None, self.backend.append, records)
+                    if self.backend.needs_compaction():
+                        # Serialized on the loop so bitmaps are not read mid-update
+                        snapshot = json.loads(json.dumps(self.jobs, default=encode_state))
+                        await loop.run_in_executor(None, self.backend.compact, snapshot)
+                else:
+                    await self.backend.append(records)
+            except Exception as e:
+                logger.error(f"Error saving batch jobs: {e}")
+
+
+def create_job_store(path, legacy_path=None):
+    if JOB_STORE == "mongo":
+        from utils.func import db
+        return JobStore(MongoBackend(db["batch_jobs"]))
+    return JobStore(FileJournalBackend(path, legacy_path))
@@ -0,0 +1,44 @@
+# Copyright (c) 2025 devgagan : https://github.com/devgaganin.
+# Licensed under the GNU General Public License v3.0.
+# See LICENSE file in the repository root for full license text.
+
+import asyncio
+import contextvars
+
+# (DeliveryOrder, seq) of the batch item the current task is working on, if any
+current_turn = contextvars.ContextVar("current_turn", default=None)
+
+
+class DeliveryOrder:
+    """Lets batch workers prepare items concurrently but deliver them in source order.
+
+    Items are numbered as they are queued. A worker downloads and uploads
+    as soon as it takes an item; only the final send waits until every
+    earlier item is finished, delivered or not.
+    """
+
+    def __init__(self):
+        self.next = 0
+        self.finished = set()
+        self.waiters = {}  # seq -> future resolved when it is that item's turn
+
+    async def wait(self, seq):
+        if seq > self.next:
+            await self.waiters.setdefault(seq, asyncio.get_running_loop().create_future())
+
+    def finish(self, seq):
+        self.finished.add(seq)
+        while self.next in self.finished:
+            self.finished.discard(self.next)
+            self.next += 1
+            waiter = self.waiters.pop(self.next, None)
+            if waiter and not waiter.done():
+                waiter.set_result(None)
+
+
+async def wait_turn():
+    """Before a final send: wait until the current batch item may be delivered"""
+    turn = current_turn.get()
+    if turn:
+        order, seq = turn
+        await order.wait(seq)
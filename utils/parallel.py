@@ -0,0 +1,311 @@
+# Copyright (c) 2025 devgagan : https://github.com/devgaganin.
+# Licensed under the GNU General Public License v3.0.
+# See LICENSE file in the repository root for full license text.
+
+import os
+import math
+import asyncio
+import logging
+import weakref
+from pyrogram import raw
+from pyrogram.errors import AuthBytesInvalid, FloodWait
+from pyrogram.file_id import FileId
+from pyrogram.session import Session, Auth
+from telethon import helpers
+from telethon.errors import FloodWaitError
+from telethon.tl import functions as tl_functions, types as tl_types
+from config import DOWNLOAD_CONNECTIONS, PARALLEL_MIN_MB, UPLOAD_WORKERS, STREAM_BUFFER_MB, FLOOD_RETRIES
+from utils.transfer import media_of, PART_SIZE, BIG_FILE_SIZE
+from utils.scratch import scratch
+
+logger = logging.getLogger(__name__)
+
+DOWNLOAD_PART = 1024 * 1024  # largest upload.getFile limit
+DEFAULT_DOWNLOAD_DIR = "downloads/"  # same default as Client.download_media
+PART_RETRIES = 3
+RETRY_DELAY = 1  # seconds, doubled on every retry of a part
+
+# client -> {dc_id: [media Session]}, reused across downloads
+SESSIONS = weakref.WeakKeyDictionary()
+SESSION_LOCKS = weakref.WeakKeyDictionary()
+
+
+async def _start_session(client, dc_id):
+    test_mode = await client.storage.test_mode()
+    if dc_id == await client.storage.dc_id():
+        session = Session(client, dc_id, await client.storage.auth_key(), test_mode, is_media=True)
+        await session.start()
+        return session
+
+    session = Session(client, dc_id, await Auth(client, dc_id, test_mode).create(), test_mode, is_media=True)
+    await session.start()
+    try:
+        for _ in range(3):
+            exported = await client.invoke(raw.functions.auth.ExportAuthorization(dc_id=dc_id))
+            try:
+                await session.invoke(raw.functions.auth.ImportAuthorization(id=exported.id, bytes=exported.bytes))
+                return session
+            except AuthBytesInvalid:
+                continue
+        raise AuthBytesInvalid
+    except BaseException:
+        await session.stop()
+        raise
+
+
+async def media_sessions(client, dc_id, count):
+    """Up to `count` media sessions to `dc_id`, opened on first use"""
+    lock = SESSION_LOCKS.setdefault(client, asyncio.Lock())
+    async with lock:
+        sessions = SESSIONS.setdefault(client, {}).setdefault(dc_id, [])
+        while len(sessions) < count:
+            sessions.append(await _start_session(client, dc_id))
+        return sessions[:count]
+
+
+async def close_sessions(client):
+    """Stop the media sessions of a client that is being stopped"""
+    for sessions in SESSIONS.pop(client, {}).values():
+        for session in sessions:
+            try:
+                await session.stop()
+            except Exception as e:
+                logger.debug(f"Error stopping media session: {e}")
+
+
+def download_path(client, file_name):
+    # Resolved like Client.download_media resolves its file_name
+    directory, name = os.path.split(file_name)
+    if not os.path.isabs(file_name):
+        directory = os.path.join(client.PARENT_DIR, directory or DEFAULT_DOWNLOAD_DIR)
+    return os.path.abspath(os.path.join(directory, name))
+
+
+async def _get_part(session, location, part):
+    for attempt in range(PART_RETRIES):
+        try:
+            r = await session.invoke(raw.functions.upload.GetFile(
+                location=location, offset=part * DOWNLOAD_PART, limit=DOWNLOAD_PART
+            ))
+            break
+        except (OSError, asyncio.TimeoutError) as e:
+            if attempt == PART_RETRIES - 1:
+                raise
+            logger.warning(f"Retrying part {part}: {e}")
+    if not isinstance(r, raw.types.upload.File):
+        # CDN redirects are left to the single-connection downloader
+        raise IOError(f"Unsupported getFile response {type(r).__name__}")
+    return r.bytes
+
+
+def _location(file_id):
+    return raw.types.InputDocumentFileLocation(
+        id=file_id.media_id,
+        access_hash=file_id.access_hash,
+        file_reference=file_id.file_reference,
+        thumb_size=file_id.thumbnail_size
+    )
+
+
+async def _download_parts(client, media, path, progress, progress_args):
+    file_id = FileId.decode(media.file_id)
+    location = _location(file_id)
+    size = media.file_size
+    parts = iter(range(math.ceil(size / DOWNLOAD_PART)))
+    sessions = await media_sessions(client, file_id.dc_id, min(DOWNLOAD_CONNECTIONS, math.ceil(size / DOWNLOAD_PART)))
+    done = 0
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.temp"
+    with open(temp_path, "wb") as f:
+        # Preallocate so every part can be written at its offset as it arrives
+        f.truncate(size)
+
+        async def worker(session):
+            nonlocal done
+            for part in parts:
+                chunk = await _get_part(session, location, part)
+                f.seek(part * DOWNLOAD_PART)
+                f.write(chunk)
+                done += len(chunk)
+                if progress:
+                    await progress(min(done, size), size, *progress_args)
+
+        tasks = [asyncio.create_task(worker(s)) for s in sessions]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            f.close()
+            os.remove(temp_path)
+            raise
+
+    if done < size:
+        os.remove(temp_path)
+        raise IOError(f"Download ended at {done}/{size} bytes")
+    os.replace(temp_path, path)
+    return path
+
+
+async def parallel_stream(client, message):
+    """Yield the media of `message` in order, its parts fetched over several connections.
+
+    A stand-in for client.stream_media that keeps nothing on disk; at most
+    STREAM_BUFFER_MB / 2 parts (at least one per connection) are in flight,
+    so together with the upload buffer memory stays near STREAM_BUFFER_MB.
+    """
+    media = media_of(message)
+    file_id = FileId.decode(media.file_id)
+    location = _location(file_id)
+    total = math.ceil(media.file_size / DOWNLOAD_PART)
+    sessions = await media_sessions(client, file_id.dc_id, min(DOWNLOAD_CONNECTIONS, total))
+    window = max(len(sessions), STREAM_BUFFER_MB // 2)
+    tasks = {}
+    queued = 0
+    try:
+        for part in range(total):
+            while queued < total and queued < part + window:
+                tasks[queued] = asyncio.create_task(_get_part(sessions[queued % len(sessions)], location, queued))
+                queued += 1
+            yield await tasks.pop(part)
+    finally:
+        for task in tasks.values():
+            task.cancel()
+
+
+def wants_parallel(message):
+    """True for media large enough to be fetched over several connections"""
+    media = media_of(message)
+    return bool(media) and DOWNLOAD_CONNECTIONS > 1 and (media.file_size or 0) >= PARALLEL_MIN_MB * 1024 * 1024
+
+
+async def parallel_download(client, message, file_name, progress=None, progress_args=()):
+    """Drop-in for client.download_media that fetches large documents over several connections.
+
+    Parts of DOWNLOAD_PART bytes are requested over DOWNLOAD_CONNECTIONS
+    media sessions to the file's DC. Photos, small files and anything the
+    parallel path cannot handle go through download_media.
+    """
+    media = media_of(message)
+    if not wants_parallel(message):
+        return await client.download_media(message, file_name=file_name, progress=progress, progress_args=progress_args)
+
+    path = download_path(client, file_name)
+    try:
+        async with client.get_file_semaphore:
+            return await _download_parts(client, media, path, progress, progress_args)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.warning(f"Parallel download failed, using a single connection: {e}")
+        return await client.download_media(message, file_name=file_name, progress=progress, progress_args=progress_args)
+
+
+async def scratch_download(client, message, file_name, progress=None, progress_args=()):
+    """parallel_download into a job directory of its own, once the file fits on disk.
+
+    Release the returned path with scratch.discard, which removes the directory.
+    """
+    media = media_of(message) or message.photo
+    job_dir = await scratch.acquire("dl", getattr(media, "file_size", 0) or 0)
+    try:
+        path = await parallel_download(client, message, os.path.join(job_dir, file_name), progress, progress_args)
+    except BaseException:
+        scratch.release(job_dir)
+        raise
+    if not path:
+        scratch.release(job_dir)
+    return path
+
+
+async def upload_parts(file_path, save_part, progress=None, progress_args=()):
+    """Upload a local file in PART_SIZE parts, UPLOAD_WORKERS at a time.
+
+    `save_part(part, total_parts, is_big, data)` sends one part with the
+    client's own saveFilePart/saveBigFilePart request; a failed part is
+    retried on its own; a FloodWait sleeps for the time Telegram asks and
+    does not use up a retry. Returns (total_parts, is_big).
+    """
+    size = os.path.getsize(file_path)
+    total_parts = max(1, math.ceil(size / PART_SIZE))
+    is_big = size > BIG_FILE_SIZE
+    parts = iter(range(total_parts))
+    done = 0
+
+    async def send(part, data):
+        attempt = floods = 0
+        while True:
+            try:
+                if await save_part(part, total_parts, is_big, data):
+                    return
+                error = IOError(f"Telegram rejected part {part}")
+            except (FloodWait, FloodWaitError) as e:
+                # Longer than the client's sleep_threshold, so it was raised to us
+                floods += 1
+                if floods > FLOOD_RETRIES:
+                    raise
+                wait = e.value if isinstance(e, FloodWait) else e.seconds
+                logger.warning(f"FloodWait of {wait}s on upload part {part}")
+                await asyncio.sleep(wait)
+                continue
+            except Exception as e:
+                error = e
+            attempt += 1
+            if attempt >= PART_RETRIES:
+                raise error
+            logger.warning(f"Retrying upload part {part}: {error}")
+            await asyncio.sleep(RETRY_DELAY * 2 ** (attempt - 1))
+
+    with open(file_path, "rb") as f:
+        async def worker():
+            nonlocal done
+            for part in parts:
+                f.seek(part * PART_SIZE)
+                data = f.read(PART_SIZE)
+                await send(part, data)
+                done += len(data)
+                if progress:
+                    await progress(min(done, size), size, *progress_args)
+
+        tasks = [asyncio.create_task(worker()) for _ in range(min(UPLOAD_WORKERS, total_parts))]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+    return total_parts, is_big
+
+
+async def parallel_upload(client, file_path, file_name=None, progress=None, progress_args=()):
+    """Upload with a Pyrogram client; returns the InputFile/InputFileBig to send"""
+    file_id = client.rnd_id()
+    file_name = file_name or os.path.basename(file_path)
+
+    async def save_part(part, total_parts, is_big, data):
+        if is_big:
+            return await client.invoke(raw.functions.upload.SaveBigFilePart(
+                file_id=file_id, file_part=part, file_total_parts=total_parts, bytes=data
+            ))
+        return await client.invoke(raw.functions.upload.SaveFilePart(file_id=file_id, file_part=part, bytes=data))
+
+    total_parts, is_big = await upload_parts(file_path, save_part, progress, progress_args)
+    if is_big:
+        return raw.types.InputFileBig(id=file_id, parts=total_parts, name=file_name)
+    return raw.types.InputFile(id=file_id, parts=total_parts, name=file_name, md5_checksum="")
+
+
+async def telethon_upload(client, file_path, file_name=None, progress=None, progress_args=()):
+    """Upload with a Telethon client; returns the InputFile/InputFileBig to pass to send_file"""
+    file_id = helpers.generate_random_long()
+    file_name = file_name or os.path.basename(file_path)
+
+    async def save_part(part, total_parts, is_big, data):
+        if is_big:
+            return await client(tl_functions.upload.SaveBigFilePartRequest(file_id, part, total_parts, data))
+        return await client(tl_functions.upload.SaveFilePartRequest(file_id, part, data))
+
+    total_parts, is_big = await upload_parts(file_path, save_part, progress, progress_args)
+    if is_big:
+        return tl_types.InputFileBig(file_id, total_parts, file_name)
+    return tl_types.InputFile(file_id, total_parts, file_name, "")
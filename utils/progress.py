@@ -0,0 +1,103 @@
+# Copyright (c) 2025 devgagan : https://github.com/devgaganin.
+# Licensed under the GNU General Public License v3.0.
+# See LICENSE file in the repository root for full license text.
+
+import time
+import asyncio
+import logging
+from config import PROGRESS_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+EWMA_ALPHA = 0.3  # weight of the newest speed sample
+
+# (client/chat, message id) -> ProgressReporter
+reporters = {}
+
+
+class ProgressReporter:
+    """Throttled renderer for one status message.
+
+    Every caller reports into it; only the latest text is kept and it is
+    written at most once per PROGRESS_INTERVAL seconds, so progress edits
+    cannot eat the chat's rate budget. It also tracks a smoothed transfer
+    speed and ETA.
+    """
+
+    def __init__(self, edit, interval=PROGRESS_INTERVAL):
+        self.edit = edit
+        self.interval = interval
+        self.pending = None
+        self.shown = None
+        self.last_flush = 0.0
+        self.task = None
+        self.reset()
+
+    def reset(self):
+        self.speed = 0.0
+        self.sample_time = None
+        self.sample_bytes = 0
+
+    def transfer(self, current, total):
+        """Feed a byte counter; returns (speed in B/s, ETA in seconds)"""
+        now = time.monotonic()
+        if self.sample_time is None or current < self.sample_bytes:
+            self.reset()
+            self.sample_time, self.sample_bytes = now, current
+        elif now > self.sample_time:
+            rate = (current - self.sample_bytes) / (now - self.sample_time)
+            self.speed = rate if not self.speed else EWMA_ALPHA * rate + (1 - EWMA_ALPHA) * self.speed
+            self.sample_time, self.sample_bytes = now, current
+        eta = (total - current) / self.speed if self.speed > 0 else 0
+        return self.speed, eta
+
+    async def update(self, text, force=False):
+        self.pending = text
+        wait = self.last_flush + self.interval - time.monotonic()
+        if force or wait <= 0:
+            await self.flush()
+        elif self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._flush_later(wait))
+
+    async def _flush_later(self, wait):
+        await asyncio.sleep(wait)
+        await self.flush()
+
+    async def flush(self):
+        text, self.pending = self.pending, None
+        if text is None or text == self.shown:
+            return
+        self.last_flush = time.monotonic()
+        try:
+            await self.edit(text)
+            self.shown = text
+        except Exception as e:
+            # MessageNotModified and deleted status messages end up here
+            logger.debug(f"Progress edit skipped: {e}")
+
+    def close(self):
+        if self.task and not self.task.done():
+            self.task.cancel()
+        self.pending = None
+
+
+def get_reporter(key, edit):
+    reporter = reporters.get(key)
+    if reporter is None:
+        reporter = reporters[key] = ProgressReporter(edit)
+    return reporter
+
+
+def discard_reporter(key):
+    reporter = reporters.pop(key, None)
+    if reporter:
+        reporter.close()
+
+
+def progress_bar(percent):
+    filled = min(10, int(percent / 10))
+    return '🟢' * filled + '🔴' * (10 - filled)
+
+
+def format_eta(seconds):
+    return time.strftime('%H:%M:%S' if seconds >= 3600 else '%M:%S', time.gmtime(seconds))
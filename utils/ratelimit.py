@@ -0,0 +1,87 @@
+# Copyright (c) 2025 devgagan : https://github.com/devgaganin.
+# Licensed under the GNU General Public License v3.0.
+# See LICENSE file in the repository root for full license text.
+
+import time
+import asyncio
+import logging
+import weakref
+from pyrogram.errors import FloodWait
+from config import DEST_RATE_PRIVATE, DEST_RATE_GROUP, SOURCE_RATE, FLOOD_RETRIES
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Token bucket that can also be paused for a FloodWait"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            if self.paused_until > now:
+                await asyncio.sleep(self.paused_until - now)
+                continue
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def pause(self, seconds):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0
+
+
+class RateScheduler:
+    """Paces API calls per (client, destination chat) and per (client, source chat).
+
+    A FloodWait only pauses the bucket that hit it; calls for other chats
+    and other clients keep running at full speed.
+    """
+
+    def __init__(self):
+        self.buckets = weakref.WeakKeyDictionary()
+
+    def bucket(self, client, kind, chat):
+        buckets = self.buckets.setdefault(client, {})
+        key = (kind, str(chat))
+        if key not in buckets:
+            if kind == "source":
+                rate, burst = SOURCE_RATE, max(1, int(SOURCE_RATE))
+            elif isinstance(chat, int) and chat > 0:
+                # Private chats: about one message per second
+                rate, burst = DEST_RATE_PRIVATE, 1
+            else:
+                # Groups and channels: about 20 messages per minute
+                rate, burst = DEST_RATE_GROUP, 3
+            buckets[key] = TokenBucket(rate, burst)
+        return buckets[key]
+
+    async def call(self, client, kind, chat, func, *args, **kwargs):
+        bucket = self.bucket(client, kind, chat)
+        for attempt in range(FLOOD_RETRIES + 1):
+            await bucket.acquire()
+            try:
+                return await func(*args, **kwargs)
+            except FloodWait as e:
+                if attempt == FLOOD_RETRIES:
+                    raise
+                logger.warning(f"FloodWait of {e.value}s on {kind} chat {chat}, retrying")
+                bucket.pause(e.value)
+
+    async def send(self, client, chat, func, *args, **kwargs):
+        return await self.call(client, "dest", chat, func, *args, **kwargs)
+
+    async def fetch(self, client, chat, func, *args, **kwargs):
+        return await self.call(client, "source", chat, func, *args, **kwargs)
+
+
+scheduler = RateScheduler()
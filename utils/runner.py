@@ -0,0 +1,97 @@
+# Copyright (c) 2025 devgagan : https://github.com/devgaganin.
+# Licensed under the GNU General Public License v3.0.
+# See LICENSE file in the repository root for full license text.
+
+import asyncio
+import logging
+from collections import deque
+from config import JOB_WORKERS, BATCH_SLOTS, PREMIUM_WEIGHT
+from utils.func import is_premium_user
+
+logger = logging.getLogger(__name__)
+
+STOP_TIMEOUT = 10  # seconds cancelled jobs get to save their checkpoints
+
+
+class JobRunner:
+    """Runs batch, /single and /dl work outside the client update handlers.
+
+    Handlers only enqueue. Jobs wait in two lanes (premium and free); each
+    lane hands out work round-robin by user, and the premium lane gets
+    PREMIUM_WEIGHT picks for every pick of the free lane. Batches run on
+    a runner of their own, so hours-long batches never hold the workers
+    short jobs wait for.
+    """
+
+    def __init__(self, workers=JOB_WORKERS, premium_weight=PREMIUM_WEIGHT):
+        self.workers = workers
+        self.premium_weight = premium_weight
+        self.lanes = {True: deque(), False: deque()}
+        self.jobs = {}
+        self.ready = asyncio.Semaphore(0)
+        self.tasks = []
+        self.picks = 0
+
+    def submit(self, user_id, factory, premium=False, name="job"):
+        """Queue `factory()` (a coroutine function) to run for user_id"""
+        self._start()
+        key = (premium, user_id)
+        if key not in self.jobs:
+            self.jobs[key] = deque()
+            self.lanes[premium].append(user_id)
+        self.jobs[key].append((name, factory))
+        self.ready.release()
+
+    async def enqueue(self, user_id, factory, name="job"):
+        self.submit(user_id, factory, await is_premium_user(user_id), name)
+
+    def pending(self):
+        return sum(len(q) for q in self.jobs.values())
+
+    async def stop(self):
+        """Cancel running jobs; an interrupted batch keeps its checkpoint and resumes on the next start"""
+        tasks, self.tasks = self.tasks, []
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.wait(tasks, timeout=STOP_TIMEOUT)
+
+    def _start(self):
+        if not self.tasks:
+            self.tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    def _pick_lane(self):
+        if not self.lanes[True]:
+            return False
+        if not self.lanes[False]:
+            return True
+        self.picks = (self.picks + 1) % (self.premium_weight + 1)
+        return self.picks != 0
+
+    def _take(self):
+        premium = self._pick_lane()
+        lane = self.lanes[premium]
+        user_id = lane.popleft()
+        key = (premium, user_id)
+        name, factory = self.jobs[key].popleft()
+        if self.jobs[key]:
+            # Back of the line until every other waiting user had a turn
+            lane.append(user_id)
+        else:
+            del self.jobs[key]
+        return user_id, name, factory
+
+    async def _worker(self):
+        while True:
+            await self.ready.acquire()
+            user_id, name, factory = self._take()
+            try:
+                await factory()
+            except Exception as e:
+                logger.error(f"Error in {name} job for {user_id}: {e}")
+
+
+BATCH_WORKERS = max(1, min(BATCH_SLOTS, JOB_WORKERS - 1))
+
+runner = JobRunner(max(1, JOB_WORKERS - BATCH_WORKERS))  # /single, /dl and other short jobs
+batch_runner = JobRunner(BATCH_WORKERS)
@@ -0,0 +1,115 @@
+# Copyright (c) 2025 devgagan : https://github.com/devgaganin.
+# Licensed under the GNU General Public License v3.0.
+# See LICENSE file in the repository root for full license text.
+
+import os
+import shutil
+import asyncio
+import logging
+import tempfile
+from config import SCRATCH_DIR, SCRATCH_BUDGET_MB, SCRATCH_MIN_FREE_MB, SCRATCH_CLEAN_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+RECHECK_INTERVAL = 5  # seconds; free space can change without a release
+
+
+class ScratchManager:
+    """Per-job working directories under SCRATCH_DIR with a disk budget.
+
+    `acquire` creates a private directory and reserves the bytes the job
+    expects to write. It waits while the reservation would exceed the
+    global budget or eat into SCRATCH_MIN_FREE_MB of free disk space.
+    `release` removes the directory with everything in it. Directories
+    not owned by a live job (left by a crash) are swept on a schedule.
+    """
+
+    def __init__(self, root=SCRATCH_DIR, budget=SCRATCH_BUDGET_MB * MB, min_free=SCRATCH_MIN_FREE_MB * MB):
+        self.root = os.path.abspath(root)
+        self.budget = budget
+        self.min_free = min_free
+        self.reserved = 0
+        self.jobs = {}  # directory -> reserved bytes
+        self.cond = asyncio.Condition()
+        self.sweeper = None
+
+    def free_space(self):
+        return shutil.disk_usage(self.root).free
+
+    def _fits(self, size):
+        # Reserved bytes may not be written yet, so count them against free space too
+        return self.reserved + size <= self.budget and self.free_space() - self.reserved - size >= self.min_free
+
+    async def reserve(self, size):
+        if size > self.budget:
+            raise OSError(f"{size / MB:.1f} MB exceeds the scratch budget")
+        async with self.cond:
+            while not self._fits(size):
+                if not self.reserved:
+                    # Nothing running will free space for this one
+                    raise OSError(f"Not enough scratch space for {size / MB:.1f} MB")
+                try:
+                    await asyncio.wait_for(self.cond.wait(), RECHECK_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+            self.reserved += size
+
+    async def acquire(self, name, size=0):
+        """Create a job directory once `size` bytes fit; returns its path"""
+        os.makedirs(self.root, exist_ok=True)
+        await self.reserve(size)
+        path = tempfile.mkdtemp(prefix=f"{name}_", dir=self.root)
+        self.jobs[path] = size
+        return path
+
+    def release(self, path):
+        size = self.jobs.pop(path, None)
+        shutil.rmtree(path, ignore_errors=True)
+        if size is not None:
+            self.reserved -= size
+            asyncio.get_running_loop().create_task(self._notify())
+
+    def discard(self, file_path):
+        """Remove a file; when it lives in a job directory the whole directory goes"""
+        directory = os.path.dirname(os.path.abspath(file_path))
+        if directory in self.jobs:
+            self.release(directory)
+        elif os.path.exists(file_path):
+            os.remove(file_path)
+
+    async def _notify(self):
+        async with self.cond:
+            self.cond.notify_all()
+
+    def sweep(self):
+        """Remove every entry under the root that no live job owns"""
+        if not os.path.isdir(self.root):
+            return 0
+        removed = 0
+        for entry in os.scandir(self.root):
+            if entry.path in self.jobs:
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                shutil.rmtree(entry.path, ignore_errors=True)
+            else:
+                os.remove(entry.path)
+            removed += 1
+        return removed
+
+    def start(self):
+        if self.sweeper is None or self.sweeper.done():
+            self.sweeper = asyncio.create_task(self._sweep_loop())
+
+    async def _sweep_loop(self):
+        while True:
+            try:
+                removed = self.sweep()
+                if removed:
+                    logger.info(f"Removed {removed} orphaned scratch entries")
+            except Exception as e:
+                logger.error(f"Error sweeping scratch space: {e}")
+            await asyncio.sleep(SCRATCH_CLEAN_INTERVAL)
+
+
+scratch = ScratchManager()
@@ -0,0 +1,239 @@
+# Copyright (c) 2025 devgagan : https://github.com/devgaganin.
+# Licensed under the GNU General Public License v3.0.
+# See LICENSE file in the repository root for full license text.
+
+import os
+import math
+import asyncio
+import logging
+import mimetypes
+from pyrogram import raw, types, utils
+from config import STREAM_BUFFER_MB
+from utils.ratelimit import scheduler
+from utils.scratch import scratch
+from utils.ordering import wait_turn
+
+logger = logging.getLogger(__name__)
+
+PART_SIZE = 512 * 1024  # upload part size accepted by Telegram
+BIG_FILE_SIZE = 10 * 1024 * 1024  # files above this must use saveBigFilePart
+
+
+def media_of(message):
+    """Return the downloadable media object of a message, if any"""
+    return message.video or message.document or message.audio
+
+
+def can_stream(message, thumb=None):
+    """True when the upload can be built from the source message alone.
+
+    Videos need duration/size from the source and a ready thumbnail;
+    otherwise the full file is required for ffmpeg/cv2 and we fall back to disk.
+    """
+    media = media_of(message)
+    if not media or not media.file_size:
+        return False
+    if message.video:
+        return bool(message.video.duration and message.video.width and (thumb or message.video.thumbs))
+    return True
+
+
+def media_attributes(message, file_name):
+    attributes = [raw.types.DocumentAttributeFilename(file_name=file_name)]
+    if message.video:
+        attributes.append(raw.types.DocumentAttributeVideo(
+            supports_streaming=True,
+            duration=message.video.duration,
+            w=message.video.width,
+            h=message.video.height
+        ))
+    elif message.audio:
+        attributes.append(raw.types.DocumentAttributeAudio(
+            duration=message.audio.duration or 0,
+            performer=message.audio.performer,
+            title=message.audio.title
+        ))
+    return attributes
+
+
+async def _produce(chunks, buffer):
+    cancelled = False
+    try:
+        async for chunk in chunks:
+            await buffer.put(chunk)
+    except asyncio.CancelledError:
+        # Cancelled by the uploader, which reads no more; a put into the full queue would never return
+        cancelled = True
+        raise
+    finally:
+        if not cancelled:
+            await buffer.put(None)
+
+
+async def _iter_parts(buffer):
+    """Re-slice streamed chunks into PART_SIZE upload parts"""
+    pending = bytearray()
+    while True:
+        chunk = await buffer.get()
+        if chunk is None:
+            break
+        pending += chunk
+        while len(pending) >= PART_SIZE:
+            yield bytes(pending[:PART_SIZE])
+            del pending[:PART_SIZE]
+    if pending:
+        yield bytes(pending)
+
+
+async def stream_upload_file(client, message, file_name, progress=None, progress_args=(), chunks=None):
+    """Upload the media of `message` while it downloads, holding at most STREAM_BUFFER_MB in memory.
+
+    `chunks` is the async iterator of the file's bytes in order, by
+    default client.stream_media(message). Returns the InputFile/InputFileBig
+    handle of the uploaded file.
+    """
+    file_size = media_of(message).file_size
+    total_parts = math.ceil(file_size / PART_SIZE)
+    is_big = file_size > BIG_FILE_SIZE
+    file_id = client.rnd_id()
+
+    # stream_media yields 1 MB chunks, so the buffer holds STREAM_BUFFER_MB of them
+    buffer = asyncio.Queue(maxsize=max(1, STREAM_BUFFER_MB))
+    producer = asyncio.create_task(_produce(chunks or client.stream_media(message), buffer))
+    done = 0
+    part = 0
+    try:
+        async for data in _iter_parts(buffer):
+            if is_big:
+                rpc = raw.functions.upload.SaveBigFilePart(
+                    file_id=file_id, file_part=part, file_total_parts=total_parts, bytes=data
+                )
+            else:
+                rpc = raw.functions.upload.SaveFilePart(file_id=file_id, file_part=part, bytes=data)
+            if not await client.invoke(rpc):
+                raise IOError(f"Telegram rejected part {part} of {file_name}")
+            part += 1
+            done += len(data)
+            if progress:
+                await progress(min(done, file_size), file_size, *progress_args)
+        await producer
+    finally:
+        if not producer.done():
+            producer.cancel()
+
+    if part != total_parts:
+        raise IOError(f"Stream ended after {part}/{total_parts} parts for {file_name}")
+    if is_big:
+        return raw.types.InputFileBig(id=file_id, parts=total_parts, name=file_name)
+    return raw.types.InputFile(id=file_id, parts=total_parts, name=file_name, md5_checksum="")
+
+
+async def send_uploaded(client, chat_id, message, input_file, file_name, caption=None, thumb=None, reply_to_message_id=None):
+    """Send an already uploaded file as the same media type as the source message"""
+    media = media_of(message)
+    mime_type = getattr(media, "mime_type", None) or mimetypes.guess_type(file_name)[0] or "application/octet-stream"
+    r = await client.invoke(
+        raw.functions.messages.SendMedia(
+            peer=await client.resolve_peer(chat_id),
+            media=raw.types.InputMediaUploadedDocument(
+                mime_type=mime_type,
+                file=input_file,
+                thumb=await client.save_file(thumb) if thumb else None,
+                attributes=media_attributes(message, file_name)
+            ),
+            reply_to_msg_id=reply_to_message_id,
+            random_id=client.rnd_id(),
+            **await utils.parse_text_entities(client, caption, None, None)
+        )
+    )
+    for update in r.updates:
+        if isinstance(update, (raw.types.UpdateNewMessage, raw.types.UpdateNewChannelMessage)):
+            return await types.Message._parse(
+                client, update.message,
+                {u.id: u for u in r.users},
+                {c.id: c for c in r.chats}
+            )
+
+
+async def stream_transfer(client, message, chat_id, file_name, caption=None, thumb=None, reply_to_message_id=None, progress=None, progress_args=(), chunks=None):
+    """Copy a media message to `chat_id` without writing the file to disk.
+
+    When no thumbnail is given the source video's own thumbnail is used,
+    which is small enough to fetch separately.
+    """
+    thumb_dir = None
+    try:
+        if not thumb and message.video and message.video.thumbs:
+            thumb_dir = await scratch.acquire("thumb")
+            thumb = await client.download_media(message.video.thumbs[0].file_id, file_name=os.path.join(thumb_dir, "thumb.jpg"))
+        input_file = await stream_upload_file(client, message, file_name, progress, progress_args, chunks)
+        # Only the send is retried on FloodWait; the uploaded parts stay valid server-side
+        await wait_turn()
+        return await scheduler.send(client, chat_id, send_uploaded, client, chat_id, message, input_file, file_name, caption, thumb, reply_to_message_id)
+    finally:
+        if thumb_dir:
+            scratch.release(thumb_dir)
+
+
+class SharedDownloads:
+    """Single-flight registry for downloads of the same source file.
+
+    The first caller for a key runs the download; concurrent callers await
+    the same task and share the local file. The file (and its scratch
+    directory) is removed when the last of them releases it. A download
+    that fails or returns no file raises for every caller and is not kept,
+    so the next request tries again.
+    """
+
+    def __init__(self):
+        self.inflight = {}  # key -> [task, refs]
+
+    @staticmethod
+    async def _run(download):
+        # download_media returns None on most errors
+        path = await download()
+        if not path:
+            raise IOError("Download returned no file")
+        return path
+
+    async def acquire(self, key, download):
+        if key is None:
+            return await self._run(download)
+        entry = self.inflight.get(key)
+        if entry is not None and entry[0].done() and (entry[0].cancelled() or entry[0].exception()):
+            # A failed download still held by callers on their way out is not reused
+            del self.inflight[key]
+            entry = None
+        if entry is None:
+            entry = self.inflight[key] = [asyncio.ensure_future(self._run(download)), 0]
+        entry[1] += 1
+        try:
+            # One caller giving up must not cancel the download for the others
+            return await asyncio.shield(entry[0])
+        except BaseException:
+            self._drop(key, entry)
+            raise
+
+    def release(self, key, path=None):
+        entry = self.inflight.get(key) if key is not None else None
+        if entry is not None:
+            self._drop(key, entry)
+        elif path:
+            scratch.discard(path)
+
+    def _drop(self, key, entry):
+        entry[1] -= 1
+        if entry[1] > 0:
+            return
+        if self.inflight.get(key) is entry:
+            del self.inflight[key]
+        task = entry[0]
+        if not task.done():
+            task.cancel()
+            return
+        path = None if task.cancelled() or task.exception() else task.result()
+        if path:
+            scratch.discard(path)
+
+
+downloads = SharedDownloads()
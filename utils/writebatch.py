@@ -0,0 +1,64 @@
+# Copyright (c) 2025 devgagan : https://github.com/devgaganin.
+# Licensed under the GNU General Public License v3.0.
+# See LICENSE file in the repository root for full license text.
+
+import asyncio
+import logging
+from config import WRITE_BATCH_INTERVAL, WRITE_BATCH_SIZE
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBatcher:
+    """Coalesces fire-and-forget Mongo writes into one bulk_write per collection.
+
+    `queue` returns at once; queued ops go out every WRITE_BATCH_INTERVAL
+    seconds, or as soon as WRITE_BATCH_SIZE are waiting. Ops queued with
+    the same key replace each other, so a burst of writes to one document
+    costs a single op. Only for writes nobody reads back right away.
+    """
+
+    def __init__(self, interval=WRITE_BATCH_INTERVAL, max_ops=WRITE_BATCH_SIZE):
+        self.interval = interval
+        self.max_ops = max_ops
+        self.pending = {}  # collection name -> (collection, {key: op})
+        self.size = 0
+        self.seq = 0
+        self.full = asyncio.Event()
+        self.flusher = None
+
+    def queue(self, collection, op, key=None):
+        if key is None:
+            self.seq += 1
+            key = ("seq", self.seq)
+        ops = self.pending.setdefault(collection.name, (collection, {}))[1]
+        if ops.pop(key, None) is None:
+            self.size += 1
+        ops[key] = op
+        if self.size >= self.max_ops:
+            self.full.set()
+        self._ensure_flusher()
+
+    def _ensure_flusher(self):
+        if self.flusher is None or self.flusher.done():
+            self.flusher = asyncio.create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        while self.pending:
+            try:
+                await asyncio.wait_for(self.full.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush()
+
+    async def flush(self):
+        self.full.clear()
+        batches, self.pending, self.size = self.pending, {}, 0
+        for collection, ops in batches.values():
+            try:
+                await collection.bulk_write(list(ops.values()), ordered=True)
+            except Exception as e:
+                logger.error(f"Error writing {len(ops)} op(s) to {collection.name}: {e}")
+
+
+writes = WriteBatcher()